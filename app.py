@@ -1,377 +1,83 @@
 import streamlit as st
-import pandas as pd
-import random
+import contextlib
 import datetime
-import calendar
 import io
-import os
-import logging
-import re
 import smtplib
-
-# --- Helper prerequisites for Spend Agent ---
-try:
-    _find_timekeeper_by_name
-except NameError:
-    def _find_timekeeper_by_name(timekeepers, name):
-        if not timekeepers:
-            return None
-        for tk in timekeepers:
-            if str(tk.get("TIMEKEEPER_NAME", "")).strip().lower() == str(name).strip().lower():
-                return tk
-        return None
-
-try:
-    _force_timekeeper_on_row
-except NameError:
-    def _force_timekeeper_on_row(row, forced_name, timekeepers):
-        # Only applies to fee lines (no EXPENSE_CODE)
-        if row.get("EXPENSE_CODE"):
-            return row
-        tk = _find_timekeeper_by_name(timekeepers, forced_name)
-        if tk is None and timekeepers:
-            tk = timekeepers[0]
-        if tk is None:
-            row["TIMEKEEPER_NAME"] = forced_name
-            return row
-        row["TIMEKEEPER_NAME"] = forced_name
-        row["TIMEKEEPER_ID"] = tk.get("TIMEKEEPER_ID", row.get("TIMEKEEPER_ID", ""))
-        row["TIMEKEEPER_CLASSIFICATION"] = tk.get("TIMEKEEPER_CLASSIFICATION", row.get("TIMEKEEPER_CLASSIFICATION", ""))
-        try:
-            row["RATE"] = float(tk.get("RATE", row.get("RATE", 0.0)))
-            hours = float(row.get("HOURS", 0))
-            row["LINE_ITEM_TOTAL"] = round(hours * float(row["RATE"]), 2)
-        except Exception:
-            pass
-        return row
-
-# --- Helper: ensure mandated lines (KBCG, John Doe, Uber E110) ---
-def _ensure_mandatory_lines(rows, timekeeper_data, invoice_desc, client_id, law_firm_id, billing_start_date, billing_end_date):
-    import datetime, random
-    def _rand_date_str():
-        delta = billing_end_date - billing_start_date
-        num_days = max(1, delta.days + 1)
-        off = random.randint(0, num_days - 1)
-        return (billing_start_date + datetime.timedelta(days=off)).strftime("%Y-%m-%d")
-
-    # KBCG fee line
-    base_tk = _find_timekeeper_by_name(timekeeper_data, "Tom Delaganis") or (timekeeper_data[0] if timekeeper_data else None)
-    rate = float(base_tk.get("RATE", 250.0)) if base_tk else 250.0
-    hours = round(random.uniform(0.5, 3.0), 1)
-    total = round(hours * rate, 2)
-    kbcg_desc = ("Commenced data entry into the KBCG e-licensing portal for Piers Walter Vermont "
-                 "form 1005 application; Drafted deficiency notice to send to client re: same; "
-                 "Scheduled follow-up call with client to review application status and address outstanding deficiencies.")
-    rows.append({
-        "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
-        "LINE_ITEM_DATE": _rand_date_str(), "TIMEKEEPER_NAME": "", "TIMEKEEPER_CLASSIFICATION": "", "TIMEKEEPER_ID": "",
-        "TASK_CODE": "L140", "ACTIVITY_CODE": "A107", "EXPENSE_CODE": "",
-        "DESCRIPTION": kbcg_desc, "HOURS": hours, "RATE": rate, "LINE_ITEM_TOTAL": total
-    })
-
-    # John Doe fee line
-    base_tk = _find_timekeeper_by_name(timekeeper_data, "Ryan Kinsey") or (timekeeper_data[0] if timekeeper_data else None)
-    rate = float(base_tk.get("RATE", 250.0)) if base_tk else 250.0
-    hours = round(random.uniform(0.5, 3.0), 1)
-    total = round(hours * rate, 2)
-    jd_desc = ("Reviewed and summarized deposition transcript of John Doe; prepared exhibit index; "
-               "updated case chronology spreadsheet for attorney review")
-    rows.append({
-        "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
-        "LINE_ITEM_DATE": _rand_date_str(), "TIMEKEEPER_NAME": "", "TIMEKEEPER_CLASSIFICATION": "", "TIMEKEEPER_ID": "",
-        "TASK_CODE": "L120", "ACTIVITY_CODE": "A102", "EXPENSE_CODE": "",
-        "DESCRIPTION": jd_desc, "HOURS": hours, "RATE": rate, "LINE_ITEM_TOTAL": total
-    })
-
-    # 10-mile Uber ride expense (E110)
-    hours = 1
-    rate = round(random.uniform(25, 80), 2)
-    total = round(hours * rate, 2)
-    uber_desc = "10-mile Uber ride to client's office"
-    rows.append({
-        "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
-        "LINE_ITEM_DATE": _rand_date_str(), "TIMEKEEPER_NAME": "", "TIMEKEEPER_CLASSIFICATION": "", "TIMEKEEPER_ID": "",
-        "TASK_CODE": "", "ACTIVITY_CODE": "", "EXPENSE_CODE": "E110",
-        "DESCRIPTION": uber_desc, "HOURS": hours, "RATE": rate, "LINE_ITEM_TOTAL": total
-    })
-
-    # Enforce timekeepers for matching keywords
-    for r in rows:
-        d = str(r.get("DESCRIPTION","")).lower()
-        if "kbcg" in d:
-            _force_timekeeper_on_row(r, "Tom Delaganis", timekeeper_data or [])
-        if "john doe" in d:
-            _force_timekeeper_on_row(r, "Ryan Kinsey", timekeeper_data or [])
-    return rows
-
+import zipfile
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
-from faker import Faker
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_LEFT, TA_RIGHT
-from PIL import Image as PILImage, ImageDraw, ImageFont
-
-# Initialize Faker outside of any Streamlit blocks so it's globally available
-faker = Faker()
-
-# --- Constants for Invoice Generator ---
-EXPENSE_CODES = {
-    "Copying": "E101", "Outside printing": "E102", "Word processing": "E103",
-    "Facsimile": "E104", "Telephone": "E105", "Online research": "E106",
-    "Delivery services/messengers": "E107", "Postage": "E108", "Local travel": "E109",
-    "Out-of-town travel": "E110", "Meals": "E111", "Court fees": "E112",
-    "Subpoena fees": "E113", "Witness fees": "E114", "Deposition transcripts": "E115",
-    "Trial transcripts": "E116", "Trial exhibits": "E117",
-    "Litigation support vendors": "E118", "Experts": "E119",
-    "Private investigators": "E120", "Arbitrators/mediators": "E121",
-    "Local counsel": "E122", "Other professionals": "E123", "Other": "E124",
-}
-EXPENSE_DESCRIPTIONS = list(EXPENSE_CODES.keys())
-OTHER_EXPENSE_DESCRIPTIONS = [desc for desc in EXPENSE_DESCRIPTIONS if EXPENSE_CODES[desc] != "E101"]
-
-DEFAULT_TASK_ACTIVITY_DESC = [
-    ("L100", "A101", "Legal Research: Analyze legal precedents"),
-    ("L110", "A101", "Legal Research: Review statutes and regulations"),
-    ("L120", "A101", "Legal Research: Draft research memorandum"),
-    ("L130", "A102", "Case Assessment: Initial case evaluation"),
-    ("L140", "A102", "Case Assessment: Develop case strategy"),
-    ("L150", "A102", "Case Assessment: Identify key legal issues"),
-    ("L160", "A103", "Fact Investigation: Interview witnesses"),
-    ("L190", "A104", "Pleadings: Draft complaint/petition"),
-    ("L200", "A104", "Pleadings: Prepare answer/response"),
-    ("L210", "A104", "Pleadings: File motion to dismiss"),
-    ("L220", "A105", "Discovery: Draft interrogatories"),
-    ("L230", "A105", "Discovery: Prepare requests for production"),
-    ("L240", "A105", "Discovery: Review opposing party's discovery responses"),
-    ("L250", "A106", "Depositions: Prepare for deposition"),
-    ("L260", "A106", "Depositions: Attend deposition"),
-    ("L300", "A107", "Motions: Argue motion in court"),
-    ("L310", "A108", "Settlement/Mediation: Prepare for mediation"),
-    ("L320", "A108", "Settlement/Mediation: Attend mediation"),
-    ("L330", "A108", "Settlement/Mediation: Draft settlement agreement"),
-    ("L340", "A109", "Trial Preparation: Prepare witness for trial"),
-    ("L350", "A109", "Trial Preparation: Organize trial exhibits"),
-    ("L390", "A110", "Trial: Present closing argument"),
-    ("L400", "A111", "Appeals: Research appellate issues"),
-    ("L410", "A111", "Appeals: Draft appellate brief"),
-    ("L420", "A111", "Appeals: Argue before appellate court"),
-    ("L430", "A112", "Client Communication: Client meeting"),
-    ("L440", "A112", "Client Communication: Phone call with client"),
-    ("L450", "A112", "Client Communication: Email correspondence with client"),
-]
-
-MAJOR_TASK_CODES = {"L110", "L120", "L130", "L140", "L150", "L160", "L170", "L180", "L190"}
-DEFAULT_CLIENT_ID = "02-4388252"
-DEFAULT_LAW_FIRM_ID = "02-1234567"
-DEFAULT_INVOICE_DESCRIPTION = "Monthly Legal Services"
 
-# --- Functions from Original Script, adapted for Streamlit ---
-def _replace_name_placeholder(description, faker_instance):
-    return description.replace("{NAME_PLACEHOLDER}", faker_instance.name())
-
-def _replace_description_dates(description):
-    pattern = r"\b(\d{2}/\d{2}/\d{4})\b"
-    if re.search(pattern, description):
-        days_ago = random.randint(15, 90)
-        new_date = (datetime.date.today() - datetime.timedelta(days=days_ago)).strftime("%m/%d/%Y")
-        return re.sub(pattern, new_date, description)
-    return description
+from invoice_engine import (
+    DEFAULT_TASK_ACTIVITY_DESC, MAJOR_TASK_CODES, DEFAULT_MAJOR_TASK_SHARE, _build_description_store, _parse_weights,
+    DEFAULT_CLIENT_ID, DEFAULT_LAW_FIRM_ID, DEFAULT_INVOICE_DESCRIPTION,
+    _check_timekeeper_rates, _format_cents, _spawn_process_pool, _summarize_invoices, _combine_invoice_summaries, _generate_invoices, _invoice_units, _manifest_digest, _load_manifest, _expand_manifest, _run_manifest_jobs,
+)
+from ledes_validate import _load_ledes_batch, _validate_ledes_batch
+from invoice_pdf import _create_pdf_volumes
+from invoice_formats import DEFAULT_OUTPUT_FORMATS, OUTPUT_FORMATS, _available_output_formats, _write_output_formats
+from synthetic_roster import SYNTHETIC_ROSTER_MAX, _synthetic_roster
+from generation_ledger import DEFAULT_LEDGER_PATH, _GenerationLedger, _ledger_run_key
+
+# --- Cached loaders: an upload is parsed once, not on every rerun ---
+# Keyed on the upload's file_id; the underscore argument is not hashed.
+@st.cache_data(show_spinner=False, max_entries=8)
+def _read_timekeeper_csv(file_id, _uploaded_file):
+    import pandas as pd
+    df = pd.read_csv(io.BytesIO(_uploaded_file.getvalue()))
+    return list(df.columns), df.to_dict(orient='records')
+
+# Shared rather than copied on every rerun; generation only reads the roster, so it must not be mutated.
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _cached_synthetic_roster(size):
+    return _synthetic_roster(size)
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _cached_description_store(file_id, _uploaded_file):
+    return _build_description_store(io.BytesIO(_uploaded_file.getvalue()))
+
+# Ledger run keys name the roster by content, so re-uploading the same tk_info.csv still resumes.
+@st.cache_data(show_spinner=False, max_entries=8)
+def _roster_digest(roster_id, _timekeeper_data):
+    return _ledger_run_key(_timekeeper_data)
 
+# --- Functions from Original Script, adapted for Streamlit ---
 def _load_timekeepers(uploaded_file):
     if uploaded_file is None:
         return None
     try:
-        df = pd.read_csv(uploaded_file)
+        columns, records = _read_timekeeper_csv(uploaded_file.file_id, uploaded_file)
         required_cols = ["TIMEKEEPER_NAME", "TIMEKEEPER_CLASSIFICATION", "TIMEKEEPER_ID", "RATE"]
-        if not all(col in df.columns for col in required_cols):
+        if not all(col in columns for col in required_cols):
             st.error(f"Timekeeper CSV must contain the following columns: {', '.join(required_cols)}")
             return None
-        return df.to_dict(orient='records')
+        # Rates are checked once here rather than failing mid-run when a fee line is priced.
+        try:
+            _check_timekeeper_rates(records)
+        except ValueError as e:
+            st.error(f"Timekeeper CSV: {e}")
+            return None
+        return records
     except Exception as e:
         st.error(f"Error loading timekeeper file: {e}")
         return None
 
 def _load_custom_task_activity_data(uploaded_file):
+    """Loads the custom line-item CSV in chunks into a memory-mapped description store."""
     if uploaded_file is None:
         return None
     try:
-        df = pd.read_csv(uploaded_file)
-        required_cols = ["TASK_CODE", "ACTIVITY_CODE", "DESCRIPTION"]
-        if not all(col in df.columns for col in required_cols):
-            st.error(f"Custom Task/Activity CSV must contain the following columns: {', '.join(required_cols)}")
+        try:
+            custom_tasks = _cached_description_store(uploaded_file.file_id, uploaded_file)
+        except ValueError as e:
+            st.error(str(e))
             return None
-        if df.empty:
+        if len(custom_tasks) == 0:
             st.warning("Custom Task/Activity CSV file is empty.")
             return []
-        custom_tasks = []
-        for _, row in df.iterrows():
-            custom_tasks.append((str(row["TASK_CODE"]), str(row["ACTIVITY_CODE"]), str(row["DESCRIPTION"])))
         return custom_tasks
     except Exception as e:
         st.error(f"Error loading custom tasks file: {e}")
-        return None
-def _create_ledes_line_1998b(row, line_no, inv_total, bill_start, bill_end, invoice_number, matter_number):
-    date_obj = datetime.datetime.strptime(row["LINE_ITEM_DATE"], "%Y-%m-%d").date()
-    hours = float(row["HOURS"])
-    rate = float(row["RATE"])
-    line_total = float(row["LINE_ITEM_TOTAL"])
-    is_expense = bool(row["EXPENSE_CODE"])
-    adj_type = "E" if is_expense else "F"
-    task_code = "" if is_expense else row.get("TASK_CODE", "")
-    activity_code = "" if is_expense else row.get("ACTIVITY_CODE", "")
-    expense_code = row.get("EXPENSE_CODE", "") if is_expense else ""
-    timekeeper_id = "" if is_expense else row.get("TIMEKEEPER_ID", "")
-    timekeeper_class = "" if is_expense else row.get("TIMEKEEPER_CLASSIFICATION", "")
-    timekeeper_name = "" if is_expense else row.get("TIMEKEEPER_NAME", "")
-    return [
-        bill_end.strftime("%Y%m%d"),
-        invoice_number,
-        str(row.get("CLIENT_ID", "")),
-        matter_number,
-        f"{inv_total:.2f}",
-        bill_start.strftime("%Y%m%d"),
-        bill_end.strftime("%Y%m%d"),
-        str(row.get("INVOICE_DESCRIPTION", "")),
-        str(line_no),
-        adj_type,
-        f"{hours:.1f}" if adj_type == "F" else f"{int(hours)}",
-        "0.00",
-        f"{line_total:.2f}",
-        date_obj.strftime("%Y%m%d"),
-        task_code,
-        expense_code,
-        activity_code,
-        timekeeper_id,
-        str(row.get("DESCRIPTION", "")),
-        str(row.get("LAW_FIRM_ID", "")),
-        f"{rate:.2f}",
-        timekeeper_name,
-        timekeeper_class,
-        matter_number
-    ]
-
-def _create_ledes_1998b_content(rows, inv_total, bill_start, bill_end, invoice_number, matter_number):
-    header = "LEDES1998B[]"
-    fields = ("INVOICE_DATE|INVOICE_NUMBER|CLIENT_ID|LAW_FIRM_MATTER_ID|INVOICE_TOTAL|BILLING_START_DATE|"
-              "BILLING_END_DATE|INVOICE_DESCRIPTION|LINE_ITEM_NUMBER|EXP/FEE/INV_ADJ_TYPE|"
-              "LINE_ITEM_NUMBER_OF_UNITS|LINE_ITEM_ADJUSTMENT_AMOUNT|LINE_ITEM_TOTAL|LINE_ITEM_DATE|"
-              "LINE_ITEM_TASK_CODE|LINE_ITEM_EXPENSE_CODE|LINE_ITEM_ACTIVITY_CODE|TIMEKEEPER_ID|"
-              "LINE_ITEM_DESCRIPTION|LAW_FIRM_ID|LINE_ITEM_UNIT_COST|TIMEKEEPER_NAME|"
-              "TIMEKEEPER_CLASSIFICATION|CLIENT_MATTER_ID[]")
-    lines = [header, fields]
-    for i, r in enumerate(rows, start=1):
-        line = _create_ledes_line_1998b(r, i, inv_total, bill_start, bill_end, invoice_number, matter_number)
-        lines.append("|".join(map(str, line)) + "[]")
-    return "\n".join(lines)
-
-def _generate_invoice_data(fee_count, expense_count, timekeeper_data, client_id, law_firm_id, invoice_desc, billing_start_date, billing_end_date, task_activity_desc, major_task_codes, max_hours_per_tk_per_day, include_block_billed, faker_instance):
-    # This is a port of the original function.
-    # It generates a list of dictionaries for a single conceptual invoice.
-    rows = []
-    delta = billing_end_date - billing_start_date
-    num_days = delta.days + 1
-    major_items = [item for item in task_activity_desc if item[0] in major_task_codes]
-    other_items = [item for item in task_activity_desc if item[0] not in major_task_codes]
-    current_invoice_total = 0.0
-    daily_hours_tracker = {}
-    MAX_DAILY_HOURS = max_hours_per_tk_per_day
-
-    # Fee records
-    for _ in range(fee_count):
-        if not task_activity_desc: break
-        tk_row = random.choice(timekeeper_data)
-        timekeeper_id = tk_row["TIMEKEEPER_ID"]
-        if major_items and random.random() < 0.7:
-            task_code, activity_code, description = random.choice(major_items)
-        elif other_items:
-            task_code, activity_code, description = random.choice(other_items)
-        else: continue
-        random_day_offset = random.randint(0, num_days - 1)
-        line_item_date = billing_start_date + datetime.timedelta(days=random_day_offset)
-        line_item_date_str = line_item_date.strftime("%Y-%m-%d")
-        current_billed_hours = daily_hours_tracker.get((line_item_date_str, timekeeper_id), 0)
-        remaining_hours_capacity = MAX_DAILY_HOURS - current_billed_hours
-        if remaining_hours_capacity <= 0: continue
-        hours_to_bill = round(random.uniform(0.5, min(8.0, remaining_hours_capacity)), 1)
-        if hours_to_bill == 0: continue
-        hourly_rate = tk_row["RATE"]
-        line_item_total = round(hours_to_bill * hourly_rate, 2)
-        current_invoice_total += line_item_total
-        daily_hours_tracker[(line_item_date_str, timekeeper_id)] = current_billed_hours + hours_to_bill
-        description = _replace_description_dates(description)
-        description = _replace_name_placeholder(description, faker_instance)
-        row = {
-            "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
-            "LINE_ITEM_DATE": line_item_date_str, "TIMEKEEPER_NAME": tk_row["TIMEKEEPER_NAME"],
-            "TIMEKEEPER_CLASSIFICATION": tk_row["TIMEKEEPER_CLASSIFICATION"],
-            "TIMEKEEPER_ID": timekeeper_id, "TASK_CODE": task_code,
-            "ACTIVITY_CODE": activity_code, "EXPENSE_CODE": "", "DESCRIPTION": description,
-            "HOURS": hours_to_bill, "RATE": hourly_rate, "LINE_ITEM_TOTAL": line_item_total
-        }
-        rows.append(row)
-
-    # Expense records (E101 and others)
-    e101_actual_count = random.randint(1, min(3, expense_count))
-    for _ in range(e101_actual_count):
-        description = "Copying"
-        expense_code = "E101"
-        hours = random.randint(1, 200)
-        rate = round(random.uniform(0.14, 0.25), 2)
-        random_day_offset = random.randint(0, num_days - 1)
-        line_item_date = billing_start_date + datetime.timedelta(days=random_day_offset)
-        line_item_total = round(hours * rate, 2)
-        current_invoice_total += line_item_total
-        row = {
-            "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
-            "LINE_ITEM_DATE": line_item_date.strftime("%Y-%m-%d"), "TIMEKEEPER_NAME": "",
-            "TIMEKEEPER_CLASSIFICATION": "", "TIMEKEEPER_ID": "", "TASK_CODE": "",
-            "ACTIVITY_CODE": "", "EXPENSE_CODE": expense_code, "DESCRIPTION": description,
-            "HOURS": hours, "RATE": rate, "LINE_ITEM_TOTAL": line_item_total
-        }
-        rows.append(row)
-
-    remaining_expense_count = expense_count - e101_actual_count
-    if remaining_expense_count > 0:
-        if not OTHER_EXPENSE_DESCRIPTIONS:
-            pass
-        else:
-            for _ in range(remaining_expense_count):
-                description = random.choice(OTHER_EXPENSE_DESCRIPTIONS)
-                expense_code = EXPENSE_CODES[description]
-                hours = 1
-                rate = round(random.uniform(25, 200), 2)
-                random_day_offset = random.randint(0, num_days - 1)
-                line_item_date = billing_start_date + datetime.timedelta(days=random_day_offset)
-                line_item_total = round(hours * rate, 2)
-                current_invoice_total += line_item_total
-                row = {
-                    "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id,
-                    "LAW_FIRM_ID": law_firm_id, "LINE_ITEM_DATE": line_item_date.strftime("%Y-%m-%d"),
-                    "TIMEKEEPER_NAME": "", "TIMEKEEPER_CLASSIFICATION": "",
-                    "TIMEKEEPER_ID": "", "TASK_CODE": "", "ACTIVITY_CODE": "",
-                    "EXPENSE_CODE": expense_code, "DESCRIPTION": description,
-                    "HOURS": hours, "RATE": rate, "LINE_ITEM_TOTAL": line_item_total
-                }
-                rows.append(row)
-
-    # Block Billing
-    if not include_block_billed:
-        rows = [row for row in rows if not ("; " in row["DESCRIPTION"])]
-    elif include_block_billed:
-        if not any('; ' in row['DESCRIPTION'] for row in rows):
-            for _, _, desc in task_activity_desc:
-                if '; ' in desc and len(rows) > 0:
-                    extra = rows[0].copy()
-                    extra['DESCRIPTION'] = desc
-                    rows.insert(0, extra)
-                    break
-    return rows, current_invoice_total
 
 
 # Helper function to get image bytes safely
@@ -405,188 +111,19 @@ def _get_logo_image_bytes():
         buf.seek(0)
         return buf
 
-def _create_pdf_invoice(df, total_amount, invoice_number, invoice_date, billing_start_date, billing_end_date, client_id, law_firm_id):
-    """
-    Generates a PDF invoice with a layout that matches the provided example.
-    Includes conditional address blocks and a clean header.
-    """
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=letter,
-        leftMargin=1.0 * inch, rightMargin=1.0 * inch,
-        topMargin=1.0 * inch, bottomMargin=1.0 * inch
-    )
-    styles = getSampleStyleSheet()
-    available_width = doc.width
-    elements = []
-
-    # --- HEADER: Law Firm | Client (Boxed) ---
-    # Section 1: Law firm info, conditionally with logo
-    if law_firm_id == DEFAULT_LAW_FIRM_ID:
-        law_firm_info = (
-            f"<b>Nelson and Murdock</b><br/>{law_firm_id}<br/>"
-            "One Park Avenue<br/>Manhattan, NY 10003"
-        )
-        logo_file_name = "nelsonmurdock2.jpg"
-    else:
-        law_firm_info = (
-            f"<b>Your Law Firm Name</b><br/>{law_firm_id}<br/>"
-            "1001 Main Street, Big City, CA 90000"
-        )
-        logo_file_name = "icon.jpg" # Using a generic placeholder image
-
-    # Dynamically build the logo path from the script's directory
-    script_dir = os.path.dirname(__file__)
-    logo_path = os.path.join(script_dir, "assets", logo_file_name)
-
-    left_style = ParagraphStyle(name="Left", parent=styles["Normal"], alignment=TA_LEFT, leading=12)
-    law_firm_para = Paragraph(law_firm_info, left_style)
-    header_left_content = law_firm_para
-
-    if law_firm_id == DEFAULT_LAW_FIRM_ID:
-        try:
-            img = Image(logo_path, width=0.6 * inch, height=0.6 * inch)
-            inner_table_data = [[img, law_firm_para]]
-            inner_table = Table(inner_table_data, colWidths=[0.7 * inch, None])
-            inner_table.setStyle(TableStyle([
-                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-                ('LEFTPADDING', (1, 0), (1, 0), 6),
-            ]))
-            header_left_content = inner_table
-        except Exception as e:
-            logging.error(f"Error loading logo image from {logo_path}: {e}")
-            st.warning("Could not load law firm logo. Using text instead.")
-            header_left_content = law_firm_para
-
-    # Section 2: Client info block, left-aligned
-    if client_id == DEFAULT_CLIENT_ID:
-        client_info = (
-            f"<b>A Onit Inc.</b><br/>{client_id}<br/>"
-            "1360 Post Oak Blvd<br/>Houston, TX 77056"
-        )
-    else:
-        client_info = (
-            f"<b>Your Company Name</b><br/>{client_id}<br/>"
-            "1000 Main Street, Big City, CA 90000"
-        )
-    client_info_style = ParagraphStyle(name="ClientInfoLeft", parent=styles["Normal"], alignment=TA_LEFT)
-    client_para = Paragraph(client_info, client_info_style)
-
-    # Combined header table
-    header_data = [
-        [header_left_content, client_para]
-    ]
-    header_table = Table(header_data, colWidths=[available_width / 2, available_width / 2])
-    header_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('BOX', (0, 0), (0, 0), 1, colors.black),
-        ('BOX', (1, 0), (1, 0), 1, colors.black),
-        ('LEFTPADDING', (0, 0), (0, 0), 6),
-        ('RIGHTPADDING', (1, 0), (1, 0), 6),
-        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-        ('ALIGN', (1, 0), (1, 0), 'LEFT'),
-    ]))
-    elements.append(header_table)
-    elements.append(Spacer(1, 0.10 * inch))
-
-    # -------- Invoice Details (right under Client Info) --------
-    right_style = ParagraphStyle(name="Right", parent=styles["Normal"], alignment=TA_RIGHT)
-    invoice_details_text = (
-        f"<b>Invoice #:</b> {invoice_number}<br/>"
-        f"<b>Invoice Date:</b> {invoice_date.strftime('%Y-%m-%d')}<br/>"
-        f"<b>Billing Period:</b> {billing_start_date.strftime('%Y-%m-%d')} to {billing_end_date.strftime('%Y-%m-%d')}"
-    )
-    details_para = Paragraph(invoice_details_text, right_style)
-    details_table = Table(
-        [['', details_para]],
-        colWidths=[available_width / 2, available_width / 2]
-    )
-    details_table.setStyle(TableStyle([
-        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (1, 0), (1, 0), 6),
-    ]))
-    elements.append(details_table)
-    elements.append(Spacer(1, 0.18*inch))
-
-    # --- INVOICE DETAILS TABLE ---
-    # Table headers
-    data = [['Date', 'Timekeeper', 'Task Code', 'Activity Code', 'Description', 'Hours', 'Rate', 'Total']]
-    
-    # Add line item rows
-    for _, row in df.iterrows():
-        # Correctly format rows to include Paragraphs for wrapping text
-        date = row['LINE_ITEM_DATE']
-        timekeeper = row['TIMEKEEPER_NAME'] if row['TIMEKEEPER_NAME'] else 'N/A'
-        task_code = row['TASK_CODE'] if row['TASK_CODE'] else 'N/A'
-        activity_code = row['ACTIVITY_CODE'] if row['ACTIVITY_CODE'] else 'N/A'
-        description = row['DESCRIPTION']
-        hours = row['HOURS']
-        rate = row['RATE']
-        total = row['LINE_ITEM_TOTAL']
-        
-        data.append([
-            date, 
-            timekeeper, 
-            task_code, 
-            activity_code, 
-            Paragraph(description, styles['Normal']),
-            f"{hours:.2f}", 
-            f"${rate:.2f}", 
-            f"${total:.2f}"
-        ])
-
-    # Table styling
-    table = Table(data, colWidths=[1 * inch, 1.25 * inch, 0.75 * inch, 0.75 * inch, 2.25 * inch, 0.75 * inch, 0.75 * inch, 0.75 * inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('BOX', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 8),
-        ('FONTSIZE', (0, 1), (-1, -1), 7),
-        ('LEFTPADDING', (0, 0), (-1, -1), 2),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 2),
-        ('TOPPADDING', (0, 0), (-1, -1), 2),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-    ]))
-    elements.append(table)
-    elements.append(Spacer(1, 0.25 * inch))
-
-    # --- TOTAL AMOUNT SECTION ---
-    total_table_data = [[
-        Paragraph(f"<b>Total Amount Due:</b>", styles['Normal']),
-        Paragraph(f"<b>${total_amount:.2f}</b>", styles['Normal'])
-    ]]
-    total_table = Table(total_table_data, colWidths=[4 * inch, None])
-    total_table.setStyle(TableStyle([
-        ('LINEBELOW', (0, 0), (-1, -1), 1, colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-    ]))
-    elements.append(total_table)
-
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
-
 def _send_email_with_attachment(recipient_email, subject, body, attachments: list):
     """
     Sends an email with multiple file attachments.
     Gets credentials from Streamlit Secrets.
     Attachments is a list of tuples: [(filename, data_bytes), ...].
+    Returns True when the message was handed to the SMTP server.
     """
     try:
         sender_email = st.secrets.email.email_from
         password = st.secrets.email.email_password
     except AttributeError:
         st.error("Email secrets not found. Please check your .streamlit/secrets.toml file.")
-        return
+        return False
 
     msg = MIMEMultipart()
     
@@ -609,8 +146,178 @@ def _send_email_with_attachment(recipient_email, subject, body, attachments: lis
             server.login(sender_email, password)
             server.send_message(msg)
         st.success(f"Email sent successfully to {recipient_email}!")
+        return True
     except Exception as e:
         st.error(f"Error sending email: {e}")
+        return False
+
+def _summary_display(summary):
+    """Summary frame with cents columns shown as dollars."""
+    return summary.assign(
+        FEES=summary["FEES_CENTS"] / 100, BLENDED_RATE=summary["BLENDED_RATE_CENTS"] / 100,
+    ).drop(columns=["FEES_CENTS", "BLENDED_RATE_CENTS"])
+
+def _render_batch_summary(invoices, batch_summary):
+    """Batch dashboard: cached per-invoice totals plus timekeeper and task rollups."""
+    import pandas as pd
+    st.subheader("Batch Summary")
+    st.dataframe(pd.DataFrame([{
+        "INVOICE_NUMBER": inv["invoice_number"], "MATTER": inv["matter_number"],
+        "BILLING_PERIOD": f"{inv['billing_start_date']:%Y-%m-%d} to {inv['billing_end_date']:%Y-%m-%d}",
+        "FEE_HOURS": inv["fee_hours"], "FEES": inv["fee_cents"] / 100,
+        "EXPENSES": inv["expense_cents"] / 100, "TOTAL": inv["total_cents"] / 100,
+    } for inv in invoices]), hide_index=True)
+    st.caption("Timekeepers")
+    st.dataframe(_summary_display(batch_summary["timekeepers"]), hide_index=True)
+    st.caption("Task Codes")
+    st.dataframe(_summary_display(batch_summary["tasks"]), hide_index=True)
+
+def _invoice_email_body(invoice):
+    return (f"Please find the attached invoice files for matter {invoice['matter_number']}.\n\n"
+            f"Invoice {invoice['invoice_number']} total: ${_format_cents(invoice['total_cents'])}")
+
+def _pdf_volume_pool(include_pdf, pdf_lines_per_volume):
+    """One process pool for a whole batch's PDF volumes, or a no-op context when invoices render in one piece."""
+    return _spawn_process_pool() if include_pdf and pdf_lines_per_volume else contextlib.nullcontext()
+
+ATTACHMENT_MIME_TYPES = {"txt": "text/plain", "xml": "application/xml", "csv": "text/csv", "pdf": "application/pdf"}
+
+def _invoice_attachments(invoice, format_files, include_pdf, pdf_lines_per_volume=0, merge_pdf_volumes=True, pdf_pool=None):
+    """Builds the [(filename, data_bytes), ...] list for one generated invoice.
+
+    `format_files` are the invoice's files from _write_output_formats. Large
+    invoices can be split into PDF volumes of `pdf_lines_per_volume` line
+    items, rendered on `pdf_pool` (see _pdf_volume_pool); unmerged volumes are
+    attached as Invoice_<n>_vol01.pdf, _vol02.pdf, ...
+    """
+    invoice_number = invoice["invoice_number"]
+    attachments = list(format_files)
+    if include_pdf:
+        volumes = _create_pdf_volumes(invoice["rows"], invoice["total_cents"], invoice_number,
+            invoice["billing_end_date"], invoice["billing_start_date"], invoice["billing_end_date"],
+            invoice["client_id"], invoice["law_firm_id"], invoice.get("summaries"),
+            lines_per_volume=pdf_lines_per_volume, merge=merge_pdf_volumes, executor=pdf_pool)
+        if len(volumes) == 1:
+            attachments.append((f"Invoice_{invoice_number}.pdf", volumes[0]))
+        else:
+            attachments.extend((f"Invoice_{invoice_number}_vol{n:02d}.pdf", volume) for n, volume in enumerate(volumes, start=1))
+    return attachments
+
+# --- Settings panels ---
+# Each panel is a fragment: changing one of its widgets reruns only that panel.
+# Widgets are keyed, and the rest of the script reads their values from
+# st.session_state when a button triggers a full run.
+@st.experimental_fragment
+def _invoice_inputs_panel():
+    st.header("Invoice Details")
+    # No st.columns() for better mobile layout
+    st.subheader("Billing Information")
+    st.text_input("Client ID:", DEFAULT_CLIENT_ID, key="client_id")
+    st.text_input("Law Firm ID:", DEFAULT_LAW_FIRM_ID, key="law_firm_id")
+    st.text_input("Matter Number:", "2025-XXXXXX", key="matter_number_base")
+    st.text_input("Invoice Number (Base):", "2025MMM-XXXXXX", key="invoice_number_base")
+    st.multiselect(
+        "Output Formats:",
+        _available_output_formats(),
+        default=DEFAULT_OUTPUT_FORMATS,
+        key="output_formats",
+        help="Every selected format is written from the same generated line items. Batch formats produce one file for "
+             "all invoices and are offered as downloads. Parquet needs pyarrow; LEDES XML 2.1 is not implemented yet."
+    )
+
+    st.subheader("Invoice Dates & Description")
+    # --- Get the start and end dates of the previous month ---
+    today = datetime.date.today()
+    first_day_of_current_month = today.replace(day=1)
+    last_day_of_previous_month = first_day_of_current_month - datetime.timedelta(days=1)
+    first_day_of_previous_month = last_day_of_previous_month.replace(day=1)
+    st.date_input("Billing Start Date", value=first_day_of_previous_month, key="billing_start_date")
+    st.date_input("Billing End Date", value=last_day_of_previous_month, key="billing_end_date")
+    st.text_area(
+        "Invoice Description (One per period, each on a new line)", 
+        value="Professional Services Rendered", 
+        height=150,
+        key="invoice_desc",
+        help="With fewer descriptions than billing periods, the descriptions are reused in turn."
+    )
+
+@st.experimental_fragment
+def _advanced_settings_panel():
+    st.header("Generation Settings")
+    st.checkbox("Spend Agent", value=False, key="spend_agent", help="Ensures 2 Fee + 1 Expense Line Items are included for Spend Agent; Slider counts will be adjusted.")
+    st.slider("Number of Fee Line Items", min_value=1, max_value=200, value=20, key="fees")
+    st.slider("Number of Expense Line Items", min_value=0, max_value=50, value=5, key="expenses")
+    st.number_input("Max Daily Timekeeper Hours:", min_value=1, max_value=24, value=16, step=1, key="max_daily_hours")
+
+    st.subheader("Sampling Weights")
+    st.slider("Share of Fee Lines from Major Task Codes", min_value=0.0, max_value=1.0,
+        value=DEFAULT_MAJOR_TASK_SHARE, step=0.05, key="major_task_share")
+    st.text_input("Major Task Codes:", ", ".join(sorted(MAJOR_TASK_CODES)), key="major_task_codes_text")
+    st.text_input("Task/Activity Code Weights:", "", key="code_weights_text",
+        help="Optional CODE=weight pairs, e.g. 'L110=2, A101=0.5'. Unlisted codes weigh 1.")
+    st.text_input("Timekeeper Classification Weights:", "", key="classification_weights_text",
+        help="Optional CLASSIFICATION=weight pairs, e.g. 'Partner=1, Associate=3'. Unlisted classifications weigh 1.")
+    
+    st.subheader("Output Settings")
+    st.checkbox("Include Block Billed Line Items", value=True, key="include_block_billed")
+    if st.checkbox("Include PDF Invoice", value=False, key="include_pdf"):
+        pdf_lines_per_volume = st.number_input("PDF Line Items per Volume:", min_value=0, value=0, step=500, key="pdf_lines_per_volume",
+            help="Splits very large invoices into volumes of this many line items, rendered in parallel. 0 keeps a single document.")
+        if pdf_lines_per_volume:
+            st.radio("PDF Volumes:", ["Merge into one PDF", "Separate files"], horizontal=True, key="pdf_volume_mode")
+    
+    if st.checkbox("Generate Multiple Invoices", key="generate_multiple", help="Create more than one invoice."):
+        multiple_periods = st.checkbox("Multiple Billing Periods", key="multiple_periods",
+            help="Backfills one invoice per prior month from the given end date, newest to oldest.")
+        if multiple_periods:
+            st.number_input("How Many Billing Periods:", min_value=2, max_value=120, value=2, step=1, key="num_periods",
+            help="Number of month-long periods to create (overrides Number of Invoices). Periods are generated in parallel.")
+        else:
+            st.number_input("Number of Invoices to Create:", min_value=1, value=1, step=1, key="num_invoices",
+            help="Creates N invoices. When 'Multiple Billing Periods' is enabled, one invoice per period.")
+
+# --- Results area ---
+@st.experimental_fragment
+def _results_area():
+    """Shows the last generation run from session state; download clicks rerun only this fragment."""
+    results = st.session_state.get("generation_results")
+    if not results:
+        return
+    if not results["send_email"]:
+        for i, (invoice, attachments_to_send) in enumerate(zip(results["invoices"], results["attachments"])):
+            st.subheader(f"Generated Invoice {i + 1}")
+            
+            # Use a text area for display
+            if "LEDES 1998B" in results["output_formats"]:
+                st.text_area("LEDES 1998B Content", invoice["ledes_content"], height=200, key=f"ledes_content_{i}")
+
+            # Download buttons, one per format file and PDF volume
+            for n, (filename, data) in enumerate(attachments_to_send):
+                st.download_button(
+                    label=f"Download {filename}",
+                    data=data,
+                    file_name=filename,
+                    mime=ATTACHMENT_MIME_TYPES.get(filename.rsplit(".", 1)[-1], "application/octet-stream"),
+                    key=f"download_{i}_{n}"
+                )
+
+    if results["bulk_files"]:
+        st.subheader("Batch Exports")
+        for n, (filename, data) in enumerate(results["bulk_files"]):
+            st.download_button(
+                label=f"Download {filename}",
+                data=data,
+                file_name=filename,
+                mime=ATTACHMENT_MIME_TYPES.get(filename.rsplit(".", 1)[-1], "application/octet-stream"),
+                key=f"download_bulk_{n}"
+            )
+
+    if results["invoices"]:
+        _render_batch_summary(results["invoices"], results["batch_summary"])
+    if results["failed"]:
+        st.warning(f"{results['failed']} invoice(s) failed to send; generate again with the same settings to retry only those.")
+    else:
+        st.success("Invoice generation complete!")
 
 # --- Streamlit App UI ---
 st.title("LEDES Invoice Generator")
@@ -619,8 +326,17 @@ st.write("Generate and optionally email LEDES and PDF invoices.")
 # --- File Upload and Output Options (collapsible for mobile) ---
 with st.expander("File Upload & Output Options"):
     st.header("File Upload")
-    uploaded_timekeeper_file = st.file_uploader("Upload Timekeeper CSV (tk_info.csv)", type="csv")
-    timekeeper_data = _load_timekeepers(uploaded_timekeeper_file)
+    use_synthetic_roster = st.checkbox("Use Synthetic Roster", value=False,
+        help="Generates a seeded timekeeper roster instead of uploading tk_info.csv, for load and scale testing. "
+             "Includes the Spend Agent timekeepers.")
+    if use_synthetic_roster:
+        roster_size = st.number_input("Synthetic Roster Size:", min_value=1, max_value=SYNTHETIC_ROSTER_MAX, value=25, step=25)
+        timekeeper_data = _cached_synthetic_roster(int(roster_size))
+        roster_id = f"synthetic:{int(roster_size)}"
+    else:
+        uploaded_timekeeper_file = st.file_uploader("Upload Timekeeper CSV (tk_info.csv)", type="csv")
+        timekeeper_data = _load_timekeepers(uploaded_timekeeper_file)
+        roster_id = uploaded_timekeeper_file.file_id if uploaded_timekeeper_file else None
 
     use_custom_tasks = st.checkbox("Use Custom Line Item Details?", value=True)
     uploaded_custom_tasks_file = None
@@ -628,13 +344,24 @@ with st.expander("File Upload & Output Options"):
         uploaded_custom_tasks_file = st.file_uploader("Upload Custom Line Items CSV (custom_details.csv)", type="csv")
     
     task_activity_desc = DEFAULT_TASK_ACTIVITY_DESC
+    task_library_id = None
     if use_custom_tasks and uploaded_custom_tasks_file:
         custom_tasks_data = _load_custom_task_activity_data(uploaded_custom_tasks_file)
         if custom_tasks_data:
             task_activity_desc = custom_tasks_data
+            task_library_id = uploaded_custom_tasks_file.file_id
     
+    uploaded_manifest_file = st.file_uploader("Upload Batch Manifest (CSV or JSON, one row per matter)", type=["csv", "json"],
+        help="Columns: CLIENT_ID, LAW_FIRM_ID, MATTER_NUMBER and optionally INVOICE_NUMBER, BILLING_START_DATE, "
+             "BILLING_END_DATE, INVOICE_DESCRIPTION, FEES, EXPENSES, NUM_INVOICES, TIMEKEEPERS (IDs or names separated by ';'). "
+             "Blank columns fall back to the settings below.")
+
     st.subheader("Output & Delivery Options")
     send_email = st.checkbox("Send Invoices via Email", value=True)
+    use_ledger = st.checkbox("Resume from Generation Ledger", value=True,
+        help=f"Records every emailed invoice's settings, seed, file hashes and delivery status in {DEFAULT_LEDGER_PATH}. "
+             "Resending the same settings, roster and line items by email skips invoices already delivered and "
+             "regenerates the rest from their recorded seeds.")
 
 # Dynamically create tabs based on the 'send_email' checkbox
 if send_email:
@@ -643,63 +370,10 @@ else:
     tab1, tab2 = st.tabs(["Invoice Inputs", "Advanced Settings"])
     
 with tab1:
-    st.header("Invoice Details")
-    # No st.columns() for better mobile layout
-    st.subheader("Billing Information")
-    client_id = st.text_input("Client ID:", DEFAULT_CLIENT_ID)
-    law_firm_id = st.text_input("Law Firm ID:", DEFAULT_LAW_FIRM_ID)
-    matter_number_base = st.text_input("Matter Number:", "2025-XXXXXX")
-    invoice_number_base = st.text_input("Invoice Number (Base):", "2025MMM-XXXXXX")
-    LEDES_OPTIONS = ["1998B", "XML 2.1"]
-    ledes_version = st.selectbox(
-        "LEDES Version:",
-        LEDES_OPTIONS,
-        key="ledes_version",
-        help="XML 2.1 export is not implemented yet; please use 1998B."
-    )
-
-    if ledes_version == "XML 2.1":
-        st.warning("This is not yet implemented - please use 1998B")
-
-    st.subheader("Invoice Dates & Description")
-    # --- Get the start and end dates of the previous month ---
-    today = datetime.date.today()
-    first_day_of_current_month = today.replace(day=1)
-    last_day_of_previous_month = first_day_of_current_month - datetime.timedelta(days=1)
-    first_day_of_previous_month = last_day_of_previous_month.replace(day=1)
-    billing_start_date = st.date_input("Billing Start Date", value=first_day_of_previous_month)
-    billing_end_date = st.date_input("Billing End Date", value=last_day_of_previous_month)
-    invoice_desc = st.text_area(
-        "Invoice Description (One per period, each on a new line)", 
-        value="Professional Services Rendered", 
-        height=150
-    )
+    _invoice_inputs_panel()
 
 with tab2:
-    st.header("Generation Settings")
-    spend_agent = st.checkbox("Spend Agent", value=False, help="Ensures 2 Fee + 1 Expense Line Items are included for Spend Agent; Slider counts will be adjusted.")
-    fees = st.slider("Number of Fee Line Items", min_value=1, max_value=200, value=20)
-    expenses = st.slider("Number of Expense Line Items", min_value=0, max_value=50, value=5)
-    max_daily_hours = st.number_input("Max Daily Timekeeper Hours:", min_value=1, max_value=24, value=16, step=1)
-    
-    st.subheader("Output Settings")
-    include_block_billed = st.checkbox("Include Block Billed Line Items", value=True)
-    include_pdf = st.checkbox("Include PDF Invoice", value=False)
-    
-    generate_multiple = st.checkbox("Generate Multiple Invoices", help="Create more than one invoice.")
-    num_invoices = 1
-    multiple_periods = False
-
-    if generate_multiple:
-        multiple_periods = st.checkbox("Multiple Billing Periods",
-            help="Backfills one invoice per prior month from the given end date, newest to oldest.")
-        if multiple_periods:
-            num_periods = st.number_input("How Many Billing Periods:", min_value=2, max_value=6, value=2, step=1,
-            help="Number of month-long periods to create (overrides Number of Invoices).")
-            num_invoices = num_periods
-        else:
-            num_invoices = st.number_input("Number of Invoices to Create:", min_value=1, value=1, step=1,
-            help="Creates N invoices. When 'Multiple Billing Periods' is enabled, one invoice per period.")
+    _advanced_settings_panel()
 
 # This if block is now necessary to place the email content into the dynamic tab
 if send_email:
@@ -713,284 +387,239 @@ else:
         
 st.markdown("---")
 generate_button = st.button("Generate Invoice(s)")
+run_manifest_button = st.button("Run Batch Manifest", disabled=uploaded_manifest_file is None)
+
+# Panel values, as last set in their fragments. Widgets that are hidden fall back to their defaults.
+settings_state = st.session_state
+output_formats = settings_state["output_formats"]
+matter_number_base = settings_state["matter_number_base"]
+invoice_number_base = settings_state["invoice_number_base"]
+billing_start_date = settings_state["billing_start_date"]
+billing_end_date = settings_state["billing_end_date"]
+invoice_desc = settings_state["invoice_desc"]
+max_daily_hours = settings_state["max_daily_hours"]
+include_pdf = settings_state["include_pdf"]
+pdf_lines_per_volume = settings_state.get("pdf_lines_per_volume", 0) if include_pdf else 0
+merge_pdf_volumes = not pdf_lines_per_volume or settings_state.get("pdf_volume_mode", "Merge into one PDF") == "Merge into one PDF"
+multiple_periods = settings_state["generate_multiple"] and settings_state.get("multiple_periods", False)
+if not settings_state["generate_multiple"]:
+    num_invoices = 1
+elif multiple_periods:
+    num_invoices = settings_state.get("num_periods", 2)
+else:
+    num_invoices = settings_state.get("num_invoices", 1)
+
+generation_settings = {
+    "client_id": settings_state["client_id"], "law_firm_id": settings_state["law_firm_id"],
+    "fees": settings_state["fees"], "expenses": settings_state["expenses"], "max_daily_hours": max_daily_hours,
+    "include_block_billed": settings_state["include_block_billed"], "spend_agent": settings_state["spend_agent"],
+    "major_task_share": settings_state["major_task_share"],
+    "major_task_codes": {c.strip() for c in settings_state["major_task_codes_text"].split(",") if c.strip()},
+}
+if generate_button or run_manifest_button:
+    try:
+        generation_settings["code_weights"] = _parse_weights(settings_state["code_weights_text"])
+        generation_settings["classification_weights"] = _parse_weights(settings_state["classification_weights_text"])
+    except ValueError as e:
+        st.error(f"Sampling weights: {e}")
+        st.stop()
 
 # --- Main app logic ---
 if generate_button:
-    if ledes_version == "XML 2.1":
-        st.error("LEDES XML 2.1 is not yet implemented. Please switch to 1998B.")
-        st.stop()
-    if timekeeper_data is None:
-        st.warning("Please upload a valid timekeeper CSV file.")
+    if not output_formats and not include_pdf:
+        st.warning("Please select at least one output format.")
+    elif timekeeper_data is None:
+        st.warning("Please upload a valid timekeeper CSV file or use a synthetic roster.")
     elif send_email and not recipient_email:
         st.warning("Please provide a recipient email address to send the invoice.")
     else:
         # NEW: Process descriptions
-        descriptions = [d.strip() for d in invoice_desc.split('\n') if d.strip()]
+        descriptions = [d.strip() for d in invoice_desc.split('\n') if d.strip()] or [DEFAULT_INVOICE_DESCRIPTION]
         num_invoices = int(num_invoices)  # Ensure num_invoices is an integer
         
-        if multiple_periods and len(descriptions) != num_invoices:
-            st.warning(f"You have selected to generate {num_invoices} invoices, but have provided {len(descriptions)} descriptions. Please provide one description per period.")
+        # Fewer descriptions than periods is fine: they are reused in turn across the periods.
+        if multiple_periods and len(descriptions) > num_invoices:
+            st.warning(f"You have selected to generate {num_invoices} invoices, but have provided {len(descriptions)} descriptions. Please provide at most one description per period.")
         else:
             progress_bar = st.progress(0)
             
-            # Loop for multiple invoices
-            for i in range(num_invoices):
-                progress_bar.progress((i + 1) / num_invoices)
-
-                # NEW: Get the correct description for the current invoice
-                current_invoice_desc = descriptions[i] if multiple_periods and i < len(descriptions) else descriptions[0]
-                
-                # Generate invoice data
-                fees_used = max(0, fees - 2) if spend_agent else fees
-                expenses_used = max(0, expenses - 1) if spend_agent else expenses
-                rows, total_amount = _generate_invoice_data(fees_used, expenses_used, timekeeper_data, client_id, law_firm_id,
-                    current_invoice_desc, billing_start_date, billing_end_date,
-                    task_activity_desc, MAJOR_TASK_CODES, max_daily_hours, include_block_billed, faker
-                )
-                rows = _ensure_mandatory_lines(rows, timekeeper_data, current_invoice_desc, client_id, law_firm_id, billing_start_date, billing_end_date) if spend_agent else rows
-                df_invoice = pd.DataFrame(rows)
-                
-                # Filenames
-                current_invoice_number = f"{invoice_number_base}-{i+1}"
-                current_matter_number = matter_number_base
-                
-                # Create LEDES 1998B content
-                ledes_content = _create_ledes_1998b_content(rows, total_amount, billing_start_date, billing_end_date, current_invoice_number, current_matter_number)
-                
-                # Prepare attachments
-                attachments_to_send = []
-                
-                # Add LEDES file
-                ledes_filename = f"LEDES_1998B_{current_invoice_number}.txt"
-                attachments_to_send.append((ledes_filename, ledes_content.encode('utf-8')))
-
-                # Add PDF file if requested
-                if include_pdf:
-                    pdf_buffer = _create_pdf_invoice(df_invoice, total_amount, current_invoice_number, billing_end_date, billing_start_date, billing_end_date, client_id, law_firm_id)
-                    pdf_filename = f"Invoice_{current_invoice_number}.pdf"
-                    attachments_to_send.append((pdf_filename, pdf_buffer.getvalue()))
-                    pdf_buffer.seek(0)
-
-                # Handle output
-                if send_email:
-                    _send_email_with_attachment(
-                        recipient_email,
-                        f"LEDES Invoice for {current_matter_number}",
-                        f"Please find the attached invoice files for matter {current_matter_number}.",
-                        attachments_to_send
-                    )
-                    
-                else:
-                    st.subheader(f"Generated Invoice {i + 1}")
-                    
-                    # Use a text area for display
-                    st.text_area("LEDES 1998B Content", ledes_content, height=200)
-
-                    # Download buttons
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.download_button(
-                            label="Download LEDES File",
-                            data=ledes_content.encode('utf-8'),
-                            file_name=ledes_filename,
-                            mime="text/plain",
-                            key=f"download_ledes_{i}"
+            # Every period is worked out up front so each invoice is an independent unit
+            units = _invoice_units(descriptions, billing_start_date, billing_end_date, num_invoices, multiple_periods,
+                                   invoice_number_base, matter_number_base)
+
+            # Only emailed runs are recorded: a rerun of identical inputs skips invoices already delivered and
+            # resumes the rest from their recorded seeds. A download run always draws fresh seeds.
+            ledger = _GenerationLedger() if use_ledger and send_email else None
+            if ledger:
+                run_key = _ledger_run_key("invoices", generation_settings, [{k: v for k, v in u.items() if k != "seed"} for u in units],
+                                          output_formats, include_pdf, pdf_lines_per_volume, merge_pdf_volumes, recipient_email,
+                                          _roster_digest(roster_id, timekeeper_data), task_library_id)
+                ledger_entries = ledger.entries(run_key)
+                for unit in units:
+                    unit["seed"] = ledger_entries.get(unit["invoice_number"], {}).get("seed") or unit["seed"]
+                delivered_before = len(units)
+                units = [u for u in units if ledger_entries.get(u["invoice_number"], {}).get("status") != "delivered"]
+                delivered_before -= len(units)
+                if delivered_before:
+                    st.info(f"Resuming from the ledger: {delivered_before} of {num_invoices} invoices were already delivered.")
+
+            # Generate every invoice (in parallel), then roll up summaries for the whole batch
+            invoices = []
+            for i, invoice in enumerate(_generate_invoices(generation_settings, timekeeper_data, task_activity_desc, units)):
+                progress_bar.progress((i + 1) / len(units))
+                invoices.append(invoice)
+            batch_summary = _summarize_invoices(invoices) if invoices else None
+            # Every selected format is written in one pass over the batch's prepared lines.
+            format_files, bulk_files = _write_output_formats(invoices, output_formats)
+            failed = 0
+            all_attachments = []
+
+            with _pdf_volume_pool(include_pdf, pdf_lines_per_volume) as pdf_pool:
+                # Loop for multiple invoices, handled in order
+                for i, invoice in enumerate(invoices):
+                    # Prepare attachments (LEDES file, plus PDF if requested)
+                    attachments_to_send = _invoice_attachments(invoice, format_files[i], include_pdf, pdf_lines_per_volume, merge_pdf_volumes, pdf_pool)
+                    all_attachments.append(attachments_to_send)
+                    if ledger:
+                        ledger.record_generated(run_key, invoice["invoice_number"], units[i], invoice["seed"], attachments_to_send)
+
+                    # Handle output
+                    if send_email:
+                        delivered = _send_email_with_attachment(
+                            recipient_email,
+                            f"LEDES Invoice for {invoice['matter_number']}",
+                            _invoice_email_body(invoice),
+                            attachments_to_send
                         )
-                    with col2:
-                        if include_pdf:
-                            pdf_buffer = _create_pdf_invoice(df_invoice, total_amount, current_invoice_number, billing_end_date, billing_start_date, billing_end_date, client_id, law_firm_id)
-                            st.download_button(
-                                label="Download PDF Invoice",
-                                data=pdf_buffer.getvalue(),
-                                file_name=pdf_filename,
-                                mime="application/pdf",
-                                key=f"download_pdf_{i}"
-                            )
-                        
-                if multiple_periods:
-                    end_of_current_period = billing_start_date - datetime.timedelta(days=1)
-                    start_of_current_period = end_of_current_period.replace(day=1)
-                    billing_start_date = start_of_current_period
-                    billing_end_date = end_of_current_period
-            
-            st.success("Invoice generation complete!")
-
-
-def _ensure_mandatory_lines(rows, timekeeper_data, invoice_desc, client_id, law_firm_id, billing_start_date, billing_end_date):
-    """Append the three mandated lines (KBCG, John Doe,  Uber) to rows, always.
-    Also enforces the timekeeper rules for any rows containing those keywords.
-    """
-    import datetime, random
-    def _rand_date_str():
-        # pick a date within the billing window
-        delta = billing_end_date - billing_start_date
-        num_days = max(1, delta.days + 1)
-        off = random.randint(0, num_days - 1)
-        return (billing_start_date + datetime.timedelta(days=off)).strftime("%Y-%m-%d")
-
-    # KBCG fee line (no forced TASK_CODE, ACTIVITY A107)
-    base_tk = _find_timekeeper_by_name(timekeeper_data, "Tom Delaganis") or (timekeeper_data[0] if timekeeper_data else None)
-    rate = float(base_tk.get("RATE", 250.0)) if base_tk else 250.0
-    hours = round(random.uniform(0.5, 3.0), 1)
-    total = round(hours * rate, 2)
-    kbcg_desc = ("Commenced data entry into the KBCG e-licensing portal for Piers Walter Vermont "
-                 "form 1005 application; Drafted deficiency notice to send to client re: same; "
-                "Scheduled follow-up call with client to review application status and address outstanding deficiencies.")
-    rows.append({
-        "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
-        "LINE_ITEM_DATE": _rand_date_str(),
-        "TIMEKEEPER_NAME": "", "TIMEKEEPER_CLASSIFICATION": "", "TIMEKEEPER_ID": "",
-        "TASK_CODE": "L140", "ACTIVITY_CODE": "A107", "EXPENSE_CODE": "",
-        "DESCRIPTION": kbcg_desc, "HOURS": hours, "RATE": rate, "LINE_ITEM_TOTAL": total
-    })
-
-    # John Doe fee line (L120/A102), block-billed style with semicolons
-    base_tk = _find_timekeeper_by_name(timekeeper_data, "Ryan Kinsey") or (timekeeper_data[0] if timekeeper_data else None)
-    rate = float(base_tk.get("RATE", 250.0)) if base_tk else 250.0
-    hours = round(random.uniform(0.5, 3.0), 1)
-    total = round(hours * rate, 2)
-    jd_desc = ("Reviewed and summarized deposition transcript of John Doe; prepared exhibit index; "
-               "updated case chronology spreadsheet for attorney review")
-    rows.append({
-        "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
-        "LINE_ITEM_DATE": _rand_date_str(),
-        "TIMEKEEPER_NAME": "", "TIMEKEEPER_CLASSIFICATION": "", "TIMEKEEPER_ID": "",
-        "TASK_CODE": "L120", "ACTIVITY_CODE": "A102", "EXPENSE_CODE": "",
-        "DESCRIPTION": jd_desc, "HOURS": hours, "RATE": rate, "LINE_ITEM_TOTAL": total
-    })
-
-    #  Uber ride expense (E110)
-    hours = 1
-    rate = round(random.uniform(25, 80), 2)
-    total = round(hours * rate, 2)
-    uber_desc = " Uber ride to client's office"
-    rows.append({
-        "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
-        "LINE_ITEM_DATE": _rand_date_str(),
-        "TIMEKEEPER_NAME": "", "TIMEKEEPER_CLASSIFICATION": "", "TIMEKEEPER_ID": "",
-        "TASK_CODE": "", "ACTIVITY_CODE": "", "EXPENSE_CODE": "E110",
-        "DESCRIPTION": uber_desc, "HOURS": hours, "RATE": rate, "LINE_ITEM_TOTAL": total
-    })
-
-    # Enforce timekeepers across all rows
-    for r in rows:
-        d = str(r.get("DESCRIPTION","")).lower()
-        if "kbcg" in d:
-            _force_timekeeper_on_row(r, "Tom Delaganis", timekeeper_data or [])
-        if "john doe" in d:
-            _force_timekeeper_on_row(r, "Ryan Kinsey", timekeeper_data or [])
-    return rows
-
-
-# --- Spend-aware override: base generator without forced mandatory lines ---
-def _generate_invoice_data(
-    fee_count, expense_count, timekeeper_data, client_id, law_firm_id, invoice_desc,
-    billing_start_date, billing_end_date, task_activity_desc, major_task_codes,
-    max_hours_per_tk_per_day, include_block_billed, faker_instance
-):
-    rows = []
-    delta = billing_end_date - billing_start_date
-    num_days = max(1, (delta.days + 1))
-    major_items = [item for item in task_activity_desc if item[0] in major_task_codes] if task_activity_desc else []
-    other_items = [item for item in task_activity_desc if item[0] not in major_task_codes] if task_activity_desc else []
-    current_invoice_total = 0.0
-    daily_hours_tracker = {}
-    MAX_DAILY_HOURS = max_hours_per_tk_per_day or 8
-
-    def _rand_date_str():
-        import random, datetime
-        off = random.randint(0, num_days - 1)
-        return (billing_start_date + datetime.timedelta(days=off)).strftime("%Y-%m-%d")
-
-    import random
-    # Fees
-    for _ in range(int(fee_count or 0)):
-        if not task_activity_desc or not timekeeper_data:
-            break
-        tk_row = random.choice(timekeeper_data)
-        timekeeper_id = tk_row.get("TIMEKEEPER_ID", "")
-        if major_items and random.random() < 0.7:
-            task_code, activity_code, description = random.choice(major_items)
-        elif other_items:
-            task_code, activity_code, description = random.choice(other_items)
-        else:
-            break
-        line_item_date_str = _rand_date_str()
-        current_billed_hours = daily_hours_tracker.get((line_item_date_str, timekeeper_id), 0.0)
-        remaining_hours_capacity = float(MAX_DAILY_HOURS) - float(current_billed_hours)
-        if remaining_hours_capacity <= 0:
-            continue
-        hours_to_bill = round(random.uniform(0.5, min(8.0, remaining_hours_capacity)), 1)
-        if hours_to_bill <= 0:
-            continue
-        try:
-            hourly_rate = float(tk_row.get("RATE", 0.0))
-        except Exception:
-            hourly_rate = 0.0
-        line_item_total = round(hours_to_bill * hourly_rate, 2)
-        current_invoice_total += line_item_total
-        daily_hours_tracker[(line_item_date_str, timekeeper_id)] = current_billed_hours + hours_to_bill
-        try:
-            description = _replace_description_dates(description)
-        except Exception:
-            pass
-        try:
-            description = _replace_name_placeholder(description, faker_instance)
-        except Exception:
-            pass
-        rows.append({
-            "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
-            "LINE_ITEM_DATE": line_item_date_str, "TIMEKEEPER_NAME": tk_row.get("TIMEKEEPER_NAME",""),
-            "TIMEKEEPER_CLASSIFICATION": tk_row.get("TIMEKEEPER_CLASSIFICATION",""),
-            "TIMEKEEPER_ID": timekeeper_id, "TASK_CODE": task_code,
-            "ACTIVITY_CODE": activity_code, "EXPENSE_CODE": "", "DESCRIPTION": description,
-            "HOURS": hours_to_bill, "RATE": hourly_rate, "LINE_ITEM_TOTAL": line_item_total
-        })
-
-    # Expenses
-    e101_actual_count = random.randint(1, min(3, int(expense_count or 0))) if expense_count else 0
-    for _ in range(e101_actual_count):
-        hours = random.randint(1, 200)
-        rate = round(random.uniform(0.14, 0.25), 2)
-        line_item_total = round(hours * rate, 2)
-        current_invoice_total += line_item_total
-        rows.append({
-            "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
-            "LINE_ITEM_DATE": _rand_date_str(),
-            "TIMEKEEPER_NAME": "", "TIMEKEEPER_CLASSIFICATION": "", "TIMEKEEPER_ID": "",
-            "TASK_CODE": "", "ACTIVITY_CODE": "", "EXPENSE_CODE": "E101",
-            "DESCRIPTION": "Copying", "HOURS": hours, "RATE": rate, "LINE_ITEM_TOTAL": line_item_total
-        })
-    remaining_expense_count = (int(expense_count or 0) - e101_actual_count) if expense_count else 0
-    try:
-        OTHER_EXPENSE_DESCRIPTIONS
-        EXPENSE_CODES
-    except NameError:
-        OTHER_EXPENSE_DESCRIPTIONS = ["Postage", "Meals", "Parking"]
-        EXPENSE_CODES = {"Postage": "E106", "Meals": "E112", "Parking": "E108"}
-    for _ in range(max(0, remaining_expense_count)):
-        description = random.choice(OTHER_EXPENSE_DESCRIPTIONS)
-        expense_code = EXPENSE_CODES.get(description, "")
-        hours = 1
-        rate = round(random.uniform(25, 200), 2)
-        line_item_total = round(hours * rate, 2)
-        current_invoice_total += line_item_total
-        rows.append({
-            "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
-            "LINE_ITEM_DATE": _rand_date_str(),
-            "TIMEKEEPER_NAME": "", "TIMEKEEPER_CLASSIFICATION": "", "TIMEKEEPER_ID": "",
-            "TASK_CODE": "", "ACTIVITY_CODE": "", "EXPENSE_CODE": expense_code,
-            "DESCRIPTION": description, "HOURS": hours, "RATE": rate, "LINE_ITEM_TOTAL": line_item_total
+                        if ledger:
+                            ledger.record_delivery(run_key, invoice["invoice_number"], delivered)
+                        failed += not delivered
+
+            # Results live in session state so they survive reruns of other fragments and download clicks.
+            st.session_state["generation_results"] = {
+                "invoices": invoices, "attachments": all_attachments, "bulk_files": bulk_files,
+                "output_formats": output_formats, "batch_summary": batch_summary,
+                "send_email": send_email, "failed": failed,
+            }
+
+_results_area()
+
+# --- Batch manifest run ---
+if run_manifest_button:
+    if not output_formats and not include_pdf:
+        st.warning("Please select at least one output format.")
+    elif timekeeper_data is None:
+        st.warning("Please upload a valid timekeeper CSV file or use a synthetic roster.")
+    elif send_email and not recipient_email:
+        st.warning("Please provide a recipient email address to send the invoice.")
+    else:
+        manifest_bytes = uploaded_manifest_file.getvalue()
+        batch_defaults = dict(generation_settings)
+        batch_defaults.update({
+            "invoice_desc": next((d.strip() for d in invoice_desc.split('\n') if d.strip()), DEFAULT_INVOICE_DESCRIPTION),
+            "billing_start_date": billing_start_date, "billing_end_date": billing_end_date,
         })
-
-    # Block billing: if disabled, drop lines with semicolons (we don't add mandated John Doe here)
-    if not include_block_billed:
-        filtered = []
-        for r in rows:
-            desc = str(r.get("DESCRIPTION",""))
-            if "; " in desc:
-                continue
-            filtered.append(r)
-        rows = filtered
-
-    return rows, current_invoice_total
+        try:
+            manifest_jobs = _expand_manifest(_load_manifest(manifest_bytes, uploaded_manifest_file.name, batch_defaults))
+        except (ValueError, KeyError) as e:
+            st.error(f"Error loading batch manifest: {e}")
+            st.stop()
+
+        # Completed job keys (and, for downloads, their files) survive reruns, so a stopped or failed batch
+        # resumes where it left off. They are keyed on every input of the run, not just the manifest, so
+        # changing formats, settings or the roster starts over instead of reusing the old files.
+        run_key = _ledger_run_key("manifest", _manifest_digest(manifest_bytes), batch_defaults,
+                                  output_formats, include_pdf, pdf_lines_per_volume, merge_pdf_volumes,
+                                  recipient_email if send_email else None,
+                                  _roster_digest(roster_id, timekeeper_data), task_library_id)
+        batch_progress = st.session_state.setdefault("manifest_progress", {})
+        batch_state = batch_progress.setdefault(run_key, {"completed": set(), "artifacts": {}})
+        completed = batch_state["completed"]
+        ledger = _GenerationLedger() if use_ledger and send_email else None
+        ledger_seeds = {}
+        if ledger:
+            ledger_entries = ledger.entries(run_key)
+            ledger_seeds = {key: entry["seed"] for key, entry in ledger_entries.items()}
+            completed.update(key for key, entry in ledger_entries.items() if entry["status"] == "delivered")
+        if completed:
+            st.info(f"Resuming batch: {len(completed)} of {len(manifest_jobs)} invoices already completed.")
+
+        progress_bar = st.progress(len(completed) / len(manifest_jobs) if manifest_jobs else 1.0)
+        failed = 0
+        generated = []
+        invoice_formats = [f for f in output_formats if not OUTPUT_FORMATS[f]["bulk"]]
+        # Each job is delivered as soon as it is generated, so an error at job k keeps jobs before it completed.
+        with _pdf_volume_pool(include_pdf, pdf_lines_per_volume) as pdf_pool:
+            try:
+                for job, invoice in _run_manifest_jobs(manifest_jobs, timekeeper_data, task_activity_desc, batch_defaults, completed, ledger_seeds):
+                    generated.append(invoice)
+                    _summarize_invoices([invoice])  # per-invoice summaries for the PDF
+                    # Batch formats are written at download time over every completed job, not just this run's.
+                    format_files, _ = _write_output_formats([invoice], invoice_formats)
+                    attachments_to_send = _invoice_attachments(invoice, format_files[0], include_pdf, pdf_lines_per_volume, merge_pdf_volumes, pdf_pool)
+                    if ledger:
+                        ledger.record_generated(run_key, job["key"], {"entry": job["entry"], "invoice_number": job["invoice_number"]},
+                                                invoice["seed"], attachments_to_send)
+                    if send_email:
+                        delivered = _send_email_with_attachment(
+                            recipient_email,
+                            f"LEDES Invoice for {invoice['matter_number']}",
+                            _invoice_email_body(invoice),
+                            attachments_to_send
+                        )
+                        if ledger:
+                            ledger.record_delivery(run_key, job["key"], delivered)
+                    else:
+                        batch_state.setdefault("ledes_lines", {})[job["key"]] = invoice["ledes_lines"]
+                        batch_state["artifacts"][job["key"]] = [
+                            (f"{invoice['matter_number']}/{filename}", data) for filename, data in attachments_to_send
+                        ]
+                        delivered = True
+                    if delivered:
+                        completed.add(job["key"])
+                    else:
+                        failed += 1
+                    progress_bar.progress(len(completed) / len(manifest_jobs))
+            except ValueError as e:
+                st.error(f"Batch stopped: {e}. The {len(generated)} invoice(s) before it were kept; fix the manifest and run again to resume.")
+        if generated:
+            _render_batch_summary(generated, _combine_invoice_summaries(generated))
+
+        if not send_email and batch_state["artifacts"]:
+            zip_buffer = io.BytesIO()
+            with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+                for job in manifest_jobs:
+                    for path, data in batch_state["artifacts"].get(job["key"], []):
+                        zf.writestr(path, data)
+                batch_lines = [{"ledes_lines": batch_state["ledes_lines"][job["key"]]}
+                               for job in manifest_jobs if job["key"] in batch_state.get("ledes_lines", {})]
+                _, bulk_files = _write_output_formats(batch_lines, [f for f in output_formats if OUTPUT_FORMATS[f]["bulk"]])
+                for filename, data in bulk_files:
+                    zf.writestr(filename, data)
+            st.download_button(
+                label="Download Batch (ZIP)",
+                data=zip_buffer.getvalue(),
+                file_name="ledes_batch.zip",
+                mime="application/zip",
+                key="download_manifest_zip"
+            )
+        if failed:
+            st.warning(f"{failed} invoice(s) failed to send; run the batch again to retry only those.")
+        elif len(completed) == len(manifest_jobs):
+            st.success(f"Batch complete: {len(manifest_jobs)} invoices across {len({j['entry']['MATTER_NUMBER'] for j in manifest_jobs})} matters.")
+
+# --- LEDES validation ---
+with st.expander("Validate LEDES 1998B Files"):
+    validation_files = st.file_uploader("Upload LEDES 1998B files", type="txt", accept_multiple_files=True)
+    validation_max_hours = st.number_input("Max Daily Timekeeper Hours to enforce:", min_value=1, max_value=24,
+        value=int(max_daily_hours), step=1, key="validation_max_hours")
+    if st.button("Validate Files", disabled=not validation_files):
+        ledes_frame, parse_errors = _load_ledes_batch((f.name, f.getvalue()) for f in validation_files)
+        for error in parse_errors:
+            st.error(error)
+        validation_issues = _validate_ledes_batch(ledes_frame, max_daily_hours=validation_max_hours)
+        if validation_issues.empty and not parse_errors:
+            st.success(f"All {len(validation_files)} files passed ({len(ledes_frame)} line items).")
+        else:
+            st.warning(f"{len(validation_issues)} issue(s) across {validation_issues['FILE'].nunique()} file(s).")
+            st.dataframe(validation_issues, hide_index=True)
@@ -0,0 +1,81 @@
+"""Output-format writer benchmark.
+
+Generates one seeded batch of invoices as a fixture and times every available
+writer in invoice_formats against it, then compares writing all formats in
+one pass with regenerating the batch once per format.
+
+    python benchmarks/bench_formats.py [--invoices 50] [--fees 200] [--repeat 5]
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_engine import DEFAULT_TASK_ACTIVITY_DESC, _generate_invoices, _invoice_units
+from invoice_formats import OUTPUT_FORMATS, _available_output_formats, _write_output_formats
+
+TIMEKEEPERS = [
+    {"TIMEKEEPER_NAME": "Tom Delaganis", "TIMEKEEPER_CLASSIFICATION": "Partner", "TIMEKEEPER_ID": "TK001", "RATE": 650},
+    {"TIMEKEEPER_NAME": "Ryan Kinsey", "TIMEKEEPER_CLASSIFICATION": "Associate", "TIMEKEEPER_ID": "TK002", "RATE": 425},
+    {"TIMEKEEPER_NAME": "Jill Hart", "TIMEKEEPER_CLASSIFICATION": "Paralegal", "TIMEKEEPER_ID": "TK003", "RATE": 195},
+]
+
+
+def _fixture(num_invoices, fees):
+    settings = {
+        "client_id": "02-4388252", "law_firm_id": "02-1234567", "fees": fees, "expenses": max(1, fees // 10),
+        "max_daily_hours": 16, "include_block_billed": True,
+    }
+    units = _invoice_units(["Professional Services Rendered"], datetime.date(2025, 1, 1), datetime.date(2025, 1, 31),
+                           num_invoices, False, "BENCH", "2025-000001", list(range(1, num_invoices + 1)))
+    return settings, units
+
+
+def _median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--invoices", type=int, default=50)
+    parser.add_argument("--fees", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    settings, units = _fixture(args.invoices, args.fees)
+
+    def generate():
+        return list(_generate_invoices(settings, TIMEKEEPERS, DEFAULT_TASK_ACTIVITY_DESC, units, max_workers=1))
+
+    invoices = generate()
+    lines = sum(len(invoice["rows"]) for invoice in invoices)
+    print(f"fixture: {len(invoices)} invoices, {lines} line items")
+    generate_ms = _median_ms(generate, args.repeat)
+    print(f"{'generate batch':<28} median {generate_ms:8.1f} ms")
+
+    names = _available_output_formats()
+    for name in names:
+        ms = _median_ms(lambda: _write_output_formats(invoices, [name]), args.repeat)
+        kind = "batch" if OUTPUT_FORMATS[name]["bulk"] else "per invoice"
+        print(f"{name:<28} median {ms:8.1f} ms  ({kind}, {lines / ms * 1000:,.0f} lines/s)")
+    missing = sorted(set(OUTPUT_FORMATS) - set(names))
+    if missing:
+        print(f"skipped (optional dependency missing): {', '.join(missing)}")
+
+    one_pass = _median_ms(lambda: _write_output_formats(generate(), names), args.repeat)
+    per_format = _median_ms(lambda: [_write_output_formats(generate(), [name]) for name in names], args.repeat)
+    print(f"{'all formats, one pass':<28} median {one_pass:8.1f} ms")
+    print(f"{'regenerate per format':<28} median {per_format:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
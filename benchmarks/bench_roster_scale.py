@@ -0,0 +1,57 @@
+"""Roster-size scaling benchmark.
+
+Builds synthetic rosters of increasing size and times, for each, building the
+roster, building the samplers and generating a fixed batch of invoices, so
+any per-timekeeper cost in generation shows up as growth down the table.
+
+    python benchmarks/bench_roster_scale.py [--sizes 10 100 1000 10000 100000] [--invoices 20] [--repeat 3]
+"""
+import argparse
+import datetime
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from invoice_engine import DEFAULT_TASK_ACTIVITY_DESC, _build_samplers, _generate_invoices, _invoice_units
+from synthetic_roster import _name_pool, _synthetic_roster
+
+SETTINGS = {
+    "client_id": "02-4388252", "law_firm_id": "02-1234567", "fees": 100, "expenses": 10,
+    "max_daily_hours": 16, "include_block_billed": True, "spend_agent": True,
+}
+
+
+def _median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1_000, 10_000, 100_000])
+    parser.add_argument("--invoices", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    units = _invoice_units(["Professional Services Rendered"], datetime.date(2025, 1, 1), datetime.date(2025, 1, 31),
+                           args.invoices, False, "SCALE", "2025-000001", list(range(1, args.invoices + 1)))
+    _name_pool(0)  # the name pool is built once per seed; keep it out of the per-size timings
+    print(f"{'roster':>8} {'build roster':>14} {'build samplers':>16} {'generate':>12} {'ms/invoice':>12}")
+    for size in args.sizes:
+        roster_ms = _median_ms(lambda: _synthetic_roster(size), args.repeat)
+        roster = _synthetic_roster(size)
+        samplers_ms = _median_ms(lambda: _build_samplers(SETTINGS, roster, DEFAULT_TASK_ACTIVITY_DESC), args.repeat)
+        generate_ms = _median_ms(
+            lambda: list(_generate_invoices(SETTINGS, roster, DEFAULT_TASK_ACTIVITY_DESC, units, max_workers=1)), args.repeat)
+        print(f"{size:>8,} {roster_ms:>11.1f} ms {samplers_ms:>13.1f} ms {generate_ms:>9.1f} ms {generate_ms / args.invoices:>9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Cold-start benchmark for app.py.
+
+Each measurement runs in a fresh interpreter so nothing is already sitting in
+sys.modules. Compares the imports app.py used to do at module level with
+importing its real module graph now (streamlit plus every local module app.py
+imports), and times a first headless run of the script itself. Heavy
+dependencies that the local modules still pull in by themselves (streamlit
+brings its own) are listed, so a stray module-level import shows up here
+rather than only as a slower cold start.
+
+    python benchmarks/bench_startup.py [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EAGER_IMPORTS = """
+import streamlit, pandas
+from faker import Faker
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
+from reportlab.lib.styles import getSampleStyleSheet
+from PIL import Image as PILImage
+Faker()
+"""
+
+APP_MODULES = ["invoice_engine", "invoice_formats", "invoice_pdf", "ledes_validate", "synthetic_roster", "generation_ledger"]
+HEAVY_MODULES = ["pandas", "numpy", "faker", "reportlab", "PIL", "pypdf", "pyarrow", "lxml"]
+
+LAZY_IMPORTS = """
+import streamlit, smtplib, zipfile
+from email.mime.multipart import MIMEMultipart
+""" + "".join(f"import {module}\n" for module in APP_MODULES)
+
+HEAVY_LOADED = "".join(f"import {module}\n" for module in APP_MODULES) + f"""
+import sys
+print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules) or "none")
+"""
+
+APP_FIRST_RUN = """
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=60)
+at.secrets["email"] = {"email_from": "bench@example.com", "email_password": "x"}
+at.run()
+"""
+
+
+def _time_snippet(snippet):
+    wrapped = (
+        "import time\n"
+        "_t0 = time.perf_counter()\n"
+        + snippet
+        + "\nprint(time.perf_counter() - _t0)\n"
+    )
+    return float(_run_snippet(wrapped))
+
+
+def _run_snippet(snippet):
+    """Runs `snippet` in a fresh interpreter and returns the last line it prints."""
+    out = subprocess.run(
+        [sys.executable, "-c", snippet],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True,
+    )
+    return out.stdout.strip().splitlines()[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cases = [
+        ("module-level imports (before)", EAGER_IMPORTS),
+        ("module-level imports (now)", LAZY_IMPORTS),
+        ("app.py first run", APP_FIRST_RUN),
+    ]
+    results = {}
+    for label, snippet in cases:
+        try:
+            samples = [_time_snippet(snippet) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as e:
+            print(f"{label:<32} failed: {e.stderr.strip().splitlines()[-1:]}")
+            continue
+        results[label] = statistics.median(samples)
+        print(f"{label:<32} median {results[label] * 1000:8.1f} ms  (n={args.repeat})")
+
+    before = results.get("module-level imports (before)")
+    now = results.get("module-level imports (now)")
+    if before and now:
+        print(f"{'cold-start saving':<32} {(before - now) * 1000:8.1f} ms")
+    try:
+        print(f"{'heavy modules loaded (now)':<32} {_run_snippet(HEAVY_LOADED)}")
+    except subprocess.CalledProcessError as e:
+        print(f"{'heavy modules loaded (now)':<32} failed: {e.stderr.strip().splitlines()[-1:]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""SQLite ledger of generated and delivered invoices.
+
+Each invoice of a run is recorded with its parameters, seed, artifact hashes
+and delivery status under a run key derived from the run's inputs. Rerunning
+the same inputs by email skips invoices that were already delivered and
+regenerates the rest from their recorded seeds, so a retry only costs the
+failures. A seed fixes the line items, not the run date: dates in custom
+descriptions are redrawn relative to today, so a resume on a later day is
+not byte-identical to the original attempt.
+"""
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+DEFAULT_LEDGER_PATH = os.environ.get("LEDES_LEDGER_PATH", "generation_ledger.sqlite3")
+LEDGER_STATUSES = ["generated", "delivered", "failed"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    run_key TEXT NOT NULL,
+    invoice_key TEXT NOT NULL,
+    params TEXT NOT NULL,
+    seed INTEGER,
+    artifacts TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_key, invoice_key)
+);
+"""
+
+
+def _ledger_json_default(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _ledger_json(value):
+    return json.dumps(value, sort_keys=True, default=_ledger_json_default)
+
+
+def _ledger_run_key(*parts):
+    """Stable digest of a run's inputs (settings dicts, dates, sets, ...)."""
+    return hashlib.sha256(_ledger_json(parts).encode("utf-8")).hexdigest()
+
+
+class _GenerationLedger:
+    """Per-invoice generation and delivery records in one SQLite file."""
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def entries(self, run_key):
+        """Returns {invoice_key: record} for every invoice already recorded under `run_key`."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM invoices WHERE run_key = ?", (run_key,)).fetchall()
+        entries = {}
+        for row in rows:
+            entry = dict(row)
+            entry["params"] = json.loads(entry["params"])
+            entry["artifacts"] = json.loads(entry["artifacts"])
+            entries[entry["invoice_key"]] = entry
+        return entries
+
+    def record_generated(self, run_key, invoice_key, params, seed, attachments):
+        """Records a (re)generated invoice and the sha256 of each (filename, data) attachment."""
+        artifacts = {name: hashlib.sha256(data).hexdigest() for name, data in attachments}
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO invoices (run_key, invoice_key, params, seed, artifacts, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'generated', ?) "
+                "ON CONFLICT (run_key, invoice_key) DO UPDATE SET "
+                "params = excluded.params, seed = excluded.seed, artifacts = excluded.artifacts, "
+                "status = 'generated', error = NULL, updated_at = excluded.updated_at",
+                (run_key, invoice_key, _ledger_json(params), seed, _ledger_json(artifacts), time.time()))
+
+    def record_delivery(self, run_key, invoice_key, delivered, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE invoices SET status = ?, error = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE run_key = ? AND invoice_key = ?",
+                ("delivered" if delivered else "failed", error, time.time(), run_key, invoice_key))
@@ -0,0 +1,1027 @@
+"""Invoice generation core shared by the Streamlit app and batch runs.
+
+Nothing in here touches Streamlit, so it can be imported from worker
+processes and scripts as well as from app.py.
+"""
+import array
+import calendar
+import concurrent.futures
+import datetime
+import decimal
+import functools
+import hashlib
+import io
+import json
+import mmap
+import multiprocessing
+import os
+import random
+import re
+import tempfile
+import weakref
+
+
+# --- Money: amounts are integer cents in the row model ---
+def _to_cents(amount):
+    """Dollars (float, str or Decimal) to integer cents, rounding half up."""
+    return int((decimal.Decimal(str(amount)) * 100).quantize(decimal.Decimal(1), rounding=decimal.ROUND_HALF_UP))
+
+
+def _line_total_cents(units, rate_cents):
+    """Exact units x rate in cents; units are tenths of an hour for fees, counts for expenses."""
+    return int((decimal.Decimal(str(units)) * rate_cents).quantize(decimal.Decimal(1), rounding=decimal.ROUND_HALF_UP))
+
+
+def _check_timekeeper_rates(timekeeper_data):
+    """Raises ValueError naming the timekeepers whose RATE _to_cents cannot read (blank, NaN or not a number)."""
+    bad = []
+    for tk in timekeeper_data:
+        try:
+            _to_cents(tk["RATE"])
+        except (decimal.InvalidOperation, ValueError, TypeError):
+            bad.append(str(tk.get("TIMEKEEPER_ID") or tk.get("TIMEKEEPER_NAME") or "?"))
+    if bad:
+        more = f" and {len(bad) - 5} more" if len(bad) > 5 else ""
+        raise ValueError(f"RATE must be a dollar amount; check timekeeper(s) {', '.join(bad[:5])}{more}.")
+
+
+def _format_cents(cents):
+    sign = "-" if cents < 0 else ""
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+
+# --- Helper prerequisites for Spend Agent ---
+def _find_timekeeper_by_name(timekeepers, name):
+    if not timekeepers:
+        return None
+    for tk in timekeepers:
+        if str(tk.get("TIMEKEEPER_NAME", "")).strip().lower() == str(name).strip().lower():
+            return tk
+    return None
+
+def _force_timekeeper_on_row(row, forced_name, timekeepers):
+    # Only applies to fee lines (no EXPENSE_CODE)
+    if row.get("EXPENSE_CODE"):
+        return row
+    tk = _find_timekeeper_by_name(timekeepers, forced_name)
+    if tk is None and timekeepers:
+        tk = timekeepers[0]
+    if tk is None:
+        row["TIMEKEEPER_NAME"] = forced_name
+        return row
+    row["TIMEKEEPER_NAME"] = forced_name
+    row["TIMEKEEPER_ID"] = tk.get("TIMEKEEPER_ID", row.get("TIMEKEEPER_ID", ""))
+    row["TIMEKEEPER_CLASSIFICATION"] = tk.get("TIMEKEEPER_CLASSIFICATION", row.get("TIMEKEEPER_CLASSIFICATION", ""))
+    try:
+        if "RATE" in tk:
+            row["RATE_CENTS"] = _to_cents(tk["RATE"])
+        row["LINE_ITEM_TOTAL_CENTS"] = _line_total_cents(row.get("HOURS", 0), row["RATE_CENTS"])
+    except Exception:
+        pass
+    return row
+
+# --- Helper: ensure mandated lines (KBCG, John Doe, Uber E110) ---
+def _ensure_mandatory_lines(rows, timekeeper_data, invoice_desc, client_id, law_firm_id, billing_start_date, billing_end_date):
+    def _rand_date_str():
+        delta = billing_end_date - billing_start_date
+        num_days = max(1, delta.days + 1)
+        off = random.randint(0, num_days - 1)
+        return (billing_start_date + datetime.timedelta(days=off)).strftime("%Y-%m-%d")
+
+    # KBCG fee line
+    base_tk = _find_timekeeper_by_name(timekeeper_data, "Tom Delaganis") or (timekeeper_data[0] if timekeeper_data else None)
+    rate = _to_cents(base_tk.get("RATE", 250.0)) if base_tk else 25000
+    hours = round(random.uniform(0.5, 3.0), 1)
+    total = _line_total_cents(hours, rate)
+    kbcg_desc = ("Commenced data entry into the KBCG e-licensing portal for Piers Walter Vermont "
+                 "form 1005 application; Drafted deficiency notice to send to client re: same; "
+                 "Scheduled follow-up call with client to review application status and address outstanding deficiencies.")
+    rows.append({
+        "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
+        "LINE_ITEM_DATE": _rand_date_str(), "TIMEKEEPER_NAME": "", "TIMEKEEPER_CLASSIFICATION": "", "TIMEKEEPER_ID": "",
+        "TASK_CODE": "L140", "ACTIVITY_CODE": "A107", "EXPENSE_CODE": "",
+        "DESCRIPTION": kbcg_desc, "HOURS": hours, "RATE_CENTS": rate, "LINE_ITEM_TOTAL_CENTS": total
+    })
+
+    # John Doe fee line
+    base_tk = _find_timekeeper_by_name(timekeeper_data, "Ryan Kinsey") or (timekeeper_data[0] if timekeeper_data else None)
+    rate = _to_cents(base_tk.get("RATE", 250.0)) if base_tk else 25000
+    hours = round(random.uniform(0.5, 3.0), 1)
+    total = _line_total_cents(hours, rate)
+    jd_desc = ("Reviewed and summarized deposition transcript of John Doe; prepared exhibit index; "
+               "updated case chronology spreadsheet for attorney review")
+    rows.append({
+        "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
+        "LINE_ITEM_DATE": _rand_date_str(), "TIMEKEEPER_NAME": "", "TIMEKEEPER_CLASSIFICATION": "", "TIMEKEEPER_ID": "",
+        "TASK_CODE": "L120", "ACTIVITY_CODE": "A102", "EXPENSE_CODE": "",
+        "DESCRIPTION": jd_desc, "HOURS": hours, "RATE_CENTS": rate, "LINE_ITEM_TOTAL_CENTS": total
+    })
+
+    # 10-mile Uber ride expense (E110)
+    hours = 1
+    rate = random.randint(2500, 8000)
+    total = _line_total_cents(hours, rate)
+    uber_desc = "10-mile Uber ride to client's office"
+    rows.append({
+        "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
+        "LINE_ITEM_DATE": _rand_date_str(), "TIMEKEEPER_NAME": "", "TIMEKEEPER_CLASSIFICATION": "", "TIMEKEEPER_ID": "",
+        "TASK_CODE": "", "ACTIVITY_CODE": "", "EXPENSE_CODE": "E110",
+        "DESCRIPTION": uber_desc, "HOURS": hours, "RATE_CENTS": rate, "LINE_ITEM_TOTAL_CENTS": total
+    })
+
+    # Enforce timekeepers for matching keywords
+    for r in rows:
+        d = str(r.get("DESCRIPTION","")).lower()
+        if "kbcg" in d:
+            _force_timekeeper_on_row(r, "Tom Delaganis", timekeeper_data or [])
+        if "john doe" in d:
+            _force_timekeeper_on_row(r, "Ryan Kinsey", timekeeper_data or [])
+    return rows
+
+
+_faker_seed = None
+
+
+@functools.lru_cache(maxsize=None)
+def _get_faker():
+    """Builds the Faker instance on first use; Faker is only needed for name placeholders."""
+    from faker import Faker
+    faker = Faker()
+    if _faker_seed is not None:
+        faker.seed_instance(_faker_seed)
+    return faker
+
+
+def _new_seed():
+    return random.SystemRandom().getrandbits(63)
+
+
+def _seed_generation(seed):
+    """Makes the next invoice reproducible from `seed` without forcing a Faker import."""
+    global _faker_seed
+    random.seed(seed)
+    _faker_seed = seed
+    if _get_faker.cache_info().currsize:
+        _get_faker().seed_instance(seed)
+
+# --- Constants for Invoice Generator ---
+EXPENSE_CODES = {
+    "Copying": "E101", "Outside printing": "E102", "Word processing": "E103",
+    "Facsimile": "E104", "Telephone": "E105", "Online research": "E106",
+    "Delivery services/messengers": "E107", "Postage": "E108", "Local travel": "E109",
+    "Out-of-town travel": "E110", "Meals": "E111", "Court fees": "E112",
+    "Subpoena fees": "E113", "Witness fees": "E114", "Deposition transcripts": "E115",
+    "Trial transcripts": "E116", "Trial exhibits": "E117",
+    "Litigation support vendors": "E118", "Experts": "E119",
+    "Private investigators": "E120", "Arbitrators/mediators": "E121",
+    "Local counsel": "E122", "Other professionals": "E123", "Other": "E124",
+}
+EXPENSE_DESCRIPTIONS = list(EXPENSE_CODES.keys())
+OTHER_EXPENSE_DESCRIPTIONS = [desc for desc in EXPENSE_DESCRIPTIONS if EXPENSE_CODES[desc] != "E101"]
+
+DEFAULT_TASK_ACTIVITY_DESC = [
+    ("L100", "A101", "Legal Research: Analyze legal precedents"),
+    ("L110", "A101", "Legal Research: Review statutes and regulations"),
+    ("L120", "A101", "Legal Research: Draft research memorandum"),
+    ("L130", "A102", "Case Assessment: Initial case evaluation"),
+    ("L140", "A102", "Case Assessment: Develop case strategy"),
+    ("L150", "A102", "Case Assessment: Identify key legal issues"),
+    ("L160", "A103", "Fact Investigation: Interview witnesses"),
+    ("L190", "A104", "Pleadings: Draft complaint/petition"),
+    ("L200", "A104", "Pleadings: Prepare answer/response"),
+    ("L210", "A104", "Pleadings: File motion to dismiss"),
+    ("L220", "A105", "Discovery: Draft interrogatories"),
+    ("L230", "A105", "Discovery: Prepare requests for production"),
+    ("L240", "A105", "Discovery: Review opposing party's discovery responses"),
+    ("L250", "A106", "Depositions: Prepare for deposition"),
+    ("L260", "A106", "Depositions: Attend deposition"),
+    ("L300", "A107", "Motions: Argue motion in court"),
+    ("L310", "A108", "Settlement/Mediation: Prepare for mediation"),
+    ("L320", "A108", "Settlement/Mediation: Attend mediation"),
+    ("L330", "A108", "Settlement/Mediation: Draft settlement agreement"),
+    ("L340", "A109", "Trial Preparation: Prepare witness for trial"),
+    ("L350", "A109", "Trial Preparation: Organize trial exhibits"),
+    ("L390", "A110", "Trial: Present closing argument"),
+    ("L400", "A111", "Appeals: Research appellate issues"),
+    ("L410", "A111", "Appeals: Draft appellate brief"),
+    ("L420", "A111", "Appeals: Argue before appellate court"),
+    ("L430", "A112", "Client Communication: Client meeting"),
+    ("L440", "A112", "Client Communication: Phone call with client"),
+    ("L450", "A112", "Client Communication: Email correspondence with client"),
+]
+
+MAJOR_TASK_CODES = {"L110", "L120", "L130", "L140", "L150", "L160", "L170", "L180", "L190"}
+DEFAULT_CLIENT_ID = "02-4388252"
+DEFAULT_LAW_FIRM_ID = "02-1234567"
+DEFAULT_INVOICE_DESCRIPTION = "Monthly Legal Services"
+
+def _replace_name_placeholder(description, faker_instance=None):
+    if "{NAME_PLACEHOLDER}" not in description:
+        return description
+    if faker_instance is None:
+        faker_instance = _get_faker()
+    return description.replace("{NAME_PLACEHOLDER}", faker_instance.name())
+
+def _replace_description_dates(description):
+    pattern = r"\b(\d{2}/\d{2}/\d{4})\b"
+    if re.search(pattern, description):
+        days_ago = random.randint(15, 90)
+        new_date = (datetime.date.today() - datetime.timedelta(days=days_ago)).strftime("%m/%d/%Y")
+        return re.sub(pattern, new_date, description)
+    return description
+
+# --- Custom line-item libraries ---
+class _DescriptionStore:
+    """Read-only task/activity library for large custom line-item CSVs.
+
+    Indexes like a list of (TASK_CODE, ACTIVITY_CODE, DESCRIPTION) tuples, but
+    only byte offsets and interned code numbers live in Python; description
+    text stays in a memory-mapped file and is decoded when a row is sampled.
+    """
+
+    def __init__(self, path, offsets, task_ids, activity_ids, task_codes, activity_codes, block_billed, owner=True):
+        self.path = path
+        self.offsets = offsets
+        self.task_ids = task_ids
+        self.activity_ids = activity_ids
+        self.task_codes = task_codes
+        self.activity_codes = activity_codes
+        self.block_billed = block_billed
+        self._open(owner)
+
+    def _open(self, owner):
+        self._samplers = {}  # task samplers by weights, see _build_task_sampler
+        self._file = open(self.path, "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if owner:
+            # Only the process that wrote the file removes it; pool workers just map it.
+            weakref.finalize(self, _remove_description_file, self._data, self._file, self.path)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_file"], state["_data"], state["_samplers"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open(owner=False)
+
+    def __len__(self):
+        return len(self.task_ids)
+
+    def codes(self, i):
+        return self.task_codes[self.task_ids[i]], self.activity_codes[self.activity_ids[i]]
+
+    def description(self, i):
+        return bytes(self._data[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("description store index out of range")
+        return (*self.codes(i), self.description(i))
+
+
+def _remove_description_file(data, file, path):
+    if isinstance(data, mmap.mmap):
+        data.close()
+    file.close()
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+DESCRIPTION_STORE_CHUNK_ROWS = 100_000
+
+
+def _build_description_store(source, chunksize=DESCRIPTION_STORE_CHUNK_ROWS):
+    """Streams a TASK_CODE/ACTIVITY_CODE/DESCRIPTION CSV into a _DescriptionStore.
+
+    The CSV is read `chunksize` rows at a time, so peak memory is one chunk
+    regardless of file size. Raises ValueError if a required column is missing.
+    """
+    import pandas as pd
+    required_cols = ["TASK_CODE", "ACTIVITY_CODE", "DESCRIPTION"]
+    offsets = array.array("Q", [0])
+    task_ids = array.array("I")
+    activity_ids = array.array("I")
+    block_billed = array.array("I")
+    task_index, activity_index = {}, {}
+    fd, path = tempfile.mkstemp(prefix="ledes_descriptions_", suffix=".bin")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            reader = pd.read_csv(source, usecols=lambda c: c in required_cols, dtype=str,
+                                 keep_default_na=False, chunksize=chunksize)
+            position = 0
+            for chunk in reader:
+                missing = [col for col in required_cols if col not in chunk.columns]
+                if missing:
+                    raise ValueError(f"Custom Task/Activity CSV must contain the following columns: {', '.join(required_cols)}")
+                start = len(task_ids)
+                task_ids.extend(task_index.setdefault(code, len(task_index)) for code in chunk["TASK_CODE"])
+                activity_ids.extend(activity_index.setdefault(code, len(activity_index)) for code in chunk["ACTIVITY_CODE"])
+                descriptions = chunk["DESCRIPTION"]
+                flagged = descriptions.str.contains("; ", regex=False).to_numpy().nonzero()[0]
+                block_billed.extend(int(i) + start for i in flagged)
+                for encoded in descriptions.str.encode("utf-8"):
+                    out.write(encoded)
+                    position += len(encoded)
+                    offsets.append(position)
+    except Exception:
+        os.remove(path)
+        raise
+    return _DescriptionStore(path, offsets, task_ids, activity_ids, list(task_index), list(activity_index), block_billed)
+
+
+def _block_billed_items(task_activity_desc):
+    """Yields library entries whose description is block billed ("; " separated)."""
+    if isinstance(task_activity_desc, _DescriptionStore):
+        for i in task_activity_desc.block_billed:
+            yield task_activity_desc[i]
+        return
+    for item in task_activity_desc:
+        if '; ' in item[2]:
+            yield item
+
+
+# --- Weighted sampling tables ---
+class _AliasSampler:
+    """Vose alias table over item weights: O(n) to build, O(1) per draw."""
+
+    def __init__(self, weights):
+        n = len(weights)
+        total = float(sum(weights))
+        if n == 0 or total <= 0:
+            raise ValueError("Sampling weights must include at least one positive weight.")
+        scaled = array.array("d", (w * n / total for w in weights))
+        self.prob = array.array("d", [1.0]) * n
+        self.alias = array.array("I", range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        self.n = n
+
+    def draw(self):
+        i = int(random.random() * self.n)
+        return i if random.random() < self.prob[i] else self.alias[i]
+
+    def draw_many(self, k):
+        return [self.draw() for _ in range(k)]
+
+
+class _GroupedSampler:
+    """Draws a group from an alias table, then one of its items uniformly.
+
+    For libraries where many rows share a weight: `order` lists item indexes
+    grouped together, group g owning order[starts[g]:starts[g + 1]].
+    """
+
+    def __init__(self, group_sampler, order, starts):
+        self.groups = group_sampler
+        self.order = order
+        self.starts = starts
+
+    def draw(self):
+        g = self.groups.draw()
+        start = int(self.starts[g])
+        return int(self.order[start + int(random.random() * (int(self.starts[g + 1]) - start))])
+
+    def draw_many(self, k):
+        return [self.draw() for _ in range(k)]
+
+
+DEFAULT_MAJOR_TASK_SHARE = 0.7
+STORE_SAMPLER_CACHE_SIZE = 4
+
+
+def _parse_weights(text):
+    """Parses "L110=2, A101=0.5" style overrides into {code: weight}."""
+    weights = {}
+    for part in re.split(r"[,\n]", text or ""):
+        if not part.strip():
+            continue
+        key, sep, value = part.partition("=")
+        try:
+            weight = float(value)
+        except ValueError:
+            weight = -1.0
+        if not sep or not key.strip() or weight < 0:
+            raise ValueError(f"Invalid weight '{part.strip()}'; use CODE=number, e.g. L110=2.")
+        weights[key.strip()] = weight
+    return weights
+
+
+def _major_share_each(n_major, n_other, major_share):
+    """Per-row weight of a major and a non-major row, as the old 70/30 split spread them."""
+    if not n_other:
+        major_share = 1.0
+    elif not n_major:
+        major_share = 0.0
+    return (major_share / n_major if n_major else 0.0), ((1.0 - major_share) / n_other if n_other else 0.0)
+
+
+def _build_store_task_sampler(store, major_task_codes, major_share, code_weights):
+    """_GroupedSampler over a _DescriptionStore's distinct (task, activity) pairs.
+
+    Every row of a pair has the same weight, so rows are counted per pair
+    straight from the code arrays and the alias table only spans the pairs.
+    """
+    import numpy as np
+    task_ids = np.frombuffer(store.task_ids, dtype=np.dtype(store.task_ids.typecode))
+    activity_ids = np.frombuffer(store.activity_ids, dtype=np.dtype(store.activity_ids.typecode))
+    pairs = task_ids.astype(np.int64) * max(1, len(store.activity_codes)) + activity_ids
+    order = np.argsort(pairs, kind="stable").astype(np.uint32)
+    sorted_pairs = pairs[order]
+    starts = np.flatnonzero(np.r_[True, sorted_pairs[1:] != sorted_pairs[:-1]])
+    counts = np.diff(np.r_[starts, len(sorted_pairs)])
+    pair_tasks = sorted_pairs[starts] // max(1, len(store.activity_codes))
+    pair_activities = sorted_pairs[starts] % max(1, len(store.activity_codes))
+
+    is_major = np.array([code in major_task_codes for code in store.task_codes], dtype=bool)[pair_tasks]
+    n_major = int(counts[is_major].sum())
+    major_each, other_each = _major_share_each(n_major, len(store) - n_major, major_share)
+    task_scale = np.array([code_weights.get(code, 1.0) for code in store.task_codes])
+    activity_scale = np.array([code_weights.get(code, 1.0) for code in store.activity_codes])
+    weights = (np.where(is_major, major_each, other_each) * task_scale[pair_tasks]
+               * activity_scale[pair_activities] * counts)
+    return _GroupedSampler(_AliasSampler(weights.tolist()), order, np.r_[starts, len(sorted_pairs)])
+
+
+def _build_task_sampler(task_activity_desc, major_task_codes=MAJOR_TASK_CODES, major_share=DEFAULT_MAJOR_TASK_SHARE, code_weights=None):
+    """Sampling table over a task library, built once and reused for every invoice in a run.
+
+    Major task codes share `major_share` of the draws and the rest share the
+    remainder, evenly within each group, as the old 70/30 split did.
+    `code_weights` then scales individual TASK_CODEs or ACTIVITY_CODEs.
+    A _DescriptionStore keeps the last few tables it was asked for, so
+    repeated runs with the same weights do not rebuild them.
+    Returns None for an empty library.
+    """
+    if not len(task_activity_desc):
+        return None
+    code_weights = code_weights or {}
+    if isinstance(task_activity_desc, _DescriptionStore):
+        key = (frozenset(major_task_codes), major_share, tuple(sorted(code_weights.items())))
+        samplers = task_activity_desc._samplers
+        if key not in samplers:
+            if len(samplers) >= STORE_SAMPLER_CACHE_SIZE:
+                samplers.pop(next(iter(samplers)))
+            samplers[key] = _build_store_task_sampler(task_activity_desc, major_task_codes, major_share, code_weights)
+        return samplers[key]
+    codes = [(item[0], item[1]) for item in task_activity_desc]
+    n_major = sum(1 for task, _ in codes if task in major_task_codes)
+    major_each, other_each = _major_share_each(n_major, len(codes) - n_major, major_share)
+    return _AliasSampler([
+        (major_each if task in major_task_codes else other_each)
+        * code_weights.get(task, 1.0) * code_weights.get(activity, 1.0)
+        for task, activity in codes
+    ])
+
+
+def _build_timekeeper_sampler(timekeeper_data, classification_weights=None):
+    """Sampling table over timekeepers, weighted by TIMEKEEPER_CLASSIFICATION (default 1)."""
+    if not timekeeper_data:
+        return None
+    classification_weights = classification_weights or {}
+    return _AliasSampler([
+        classification_weights.get(str(tk.get("TIMEKEEPER_CLASSIFICATION", "")), 1.0)
+        for tk in timekeeper_data
+    ])
+
+
+def _build_samplers(settings, timekeeper_data, task_activity_desc):
+    """Returns (task_sampler, timekeeper_sampler) for the weights in a settings dict."""
+    task_sampler = _build_task_sampler(
+        task_activity_desc,
+        settings.get("major_task_codes", MAJOR_TASK_CODES),
+        settings.get("major_task_share", DEFAULT_MAJOR_TASK_SHARE),
+        settings.get("code_weights"),
+    )
+    return task_sampler, _build_timekeeper_sampler(timekeeper_data, settings.get("classification_weights"))
+
+
+def _create_ledes_line_1998b(row, line_no, inv_total_cents, bill_start, bill_end, invoice_number, matter_number):
+    date_obj = datetime.datetime.strptime(row["LINE_ITEM_DATE"], "%Y-%m-%d").date()
+    hours = float(row["HOURS"])
+    is_expense = bool(row["EXPENSE_CODE"])
+    adj_type = "E" if is_expense else "F"
+    task_code = "" if is_expense else row.get("TASK_CODE", "")
+    activity_code = "" if is_expense else row.get("ACTIVITY_CODE", "")
+    expense_code = row.get("EXPENSE_CODE", "") if is_expense else ""
+    timekeeper_id = "" if is_expense else row.get("TIMEKEEPER_ID", "")
+    timekeeper_class = "" if is_expense else row.get("TIMEKEEPER_CLASSIFICATION", "")
+    timekeeper_name = "" if is_expense else row.get("TIMEKEEPER_NAME", "")
+    return [
+        bill_end.strftime("%Y%m%d"),
+        invoice_number,
+        str(row.get("CLIENT_ID", "")),
+        matter_number,
+        _format_cents(inv_total_cents),
+        bill_start.strftime("%Y%m%d"),
+        bill_end.strftime("%Y%m%d"),
+        str(row.get("INVOICE_DESCRIPTION", "")),
+        str(line_no),
+        adj_type,
+        f"{hours:.1f}" if adj_type == "F" else f"{int(hours)}",
+        "0.00",
+        _format_cents(row["LINE_ITEM_TOTAL_CENTS"]),
+        date_obj.strftime("%Y%m%d"),
+        task_code,
+        expense_code,
+        activity_code,
+        timekeeper_id,
+        str(row.get("DESCRIPTION", "")),
+        str(row.get("LAW_FIRM_ID", "")),
+        _format_cents(row["RATE_CENTS"]),
+        timekeeper_name,
+        timekeeper_class,
+        matter_number
+    ]
+
+LEDES_1998B_FIELDS = [
+    "INVOICE_DATE", "INVOICE_NUMBER", "CLIENT_ID", "LAW_FIRM_MATTER_ID", "INVOICE_TOTAL", "BILLING_START_DATE",
+    "BILLING_END_DATE", "INVOICE_DESCRIPTION", "LINE_ITEM_NUMBER", "EXP/FEE/INV_ADJ_TYPE",
+    "LINE_ITEM_NUMBER_OF_UNITS", "LINE_ITEM_ADJUSTMENT_AMOUNT", "LINE_ITEM_TOTAL", "LINE_ITEM_DATE",
+    "LINE_ITEM_TASK_CODE", "LINE_ITEM_EXPENSE_CODE", "LINE_ITEM_ACTIVITY_CODE", "TIMEKEEPER_ID",
+    "LINE_ITEM_DESCRIPTION", "LAW_FIRM_ID", "LINE_ITEM_UNIT_COST", "TIMEKEEPER_NAME",
+    "TIMEKEEPER_CLASSIFICATION", "CLIENT_MATTER_ID",
+]
+
+def _create_ledes_1998b_lines(rows, inv_total_cents, bill_start, bill_end, invoice_number, matter_number):
+    """Formats every row once into LEDES_1998B_FIELDS order; all output formats are written from these lines."""
+    return [list(map(str, _create_ledes_line_1998b(r, i, inv_total_cents, bill_start, bill_end, invoice_number, matter_number)))
+            for i, r in enumerate(rows, start=1)]
+
+def _create_ledes_1998b_content(rows, inv_total_cents, bill_start, bill_end, invoice_number, matter_number, ledes_lines=None):
+    if ledes_lines is None:
+        ledes_lines = _create_ledes_1998b_lines(rows, inv_total_cents, bill_start, bill_end, invoice_number, matter_number)
+    lines = ["LEDES1998B[]", "|".join(LEDES_1998B_FIELDS) + "[]"]
+    lines.extend("|".join(line) + "[]" for line in ledes_lines)
+    return "\n".join(lines)
+
+def _generate_invoice_data(fee_count, expense_count, timekeeper_data, client_id, law_firm_id, invoice_desc, billing_start_date, billing_end_date, task_activity_desc, major_task_codes, max_hours_per_tk_per_day, include_block_billed, faker_instance, task_sampler=None, timekeeper_sampler=None):
+    # This is a port of the original function.
+    # It generates a list of dictionaries for a single conceptual invoice.
+    # Pass prebuilt samplers (see _build_samplers) to reuse them across invoices.
+    rows = []
+    delta = billing_end_date - billing_start_date
+    num_days = delta.days + 1
+    if task_sampler is None:
+        task_sampler = _build_task_sampler(task_activity_desc, major_task_codes)
+    if timekeeper_sampler is None:
+        timekeeper_sampler = _build_timekeeper_sampler(timekeeper_data)
+    daily_hours_tracker = {}
+    MAX_DAILY_HOURS = max_hours_per_tk_per_day
+
+    # Fee records (task and timekeeper picks drawn in one batch)
+    if task_sampler is None or timekeeper_sampler is None:
+        fee_count = 0
+    fee_draws = zip(task_sampler.draw_many(fee_count), timekeeper_sampler.draw_many(fee_count)) if fee_count else ()
+    for task_index, tk_index in fee_draws:
+        tk_row = timekeeper_data[tk_index]
+        timekeeper_id = tk_row["TIMEKEEPER_ID"]
+        task_code, activity_code, description = task_activity_desc[task_index]
+        random_day_offset = random.randint(0, num_days - 1)
+        line_item_date = billing_start_date + datetime.timedelta(days=random_day_offset)
+        line_item_date_str = line_item_date.strftime("%Y-%m-%d")
+        current_billed_hours = daily_hours_tracker.get((line_item_date_str, timekeeper_id), 0)
+        remaining_hours_capacity = MAX_DAILY_HOURS - current_billed_hours
+        if remaining_hours_capacity <= 0: continue
+        hours_to_bill = round(random.uniform(0.5, min(8.0, remaining_hours_capacity)), 1)
+        if hours_to_bill == 0: continue
+        hourly_rate = _to_cents(tk_row["RATE"])
+        line_item_total = _line_total_cents(hours_to_bill, hourly_rate)
+        daily_hours_tracker[(line_item_date_str, timekeeper_id)] = current_billed_hours + hours_to_bill
+        description = _replace_description_dates(description)
+        description = _replace_name_placeholder(description, faker_instance)
+        row = {
+            "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
+            "LINE_ITEM_DATE": line_item_date_str, "TIMEKEEPER_NAME": tk_row["TIMEKEEPER_NAME"],
+            "TIMEKEEPER_CLASSIFICATION": tk_row["TIMEKEEPER_CLASSIFICATION"],
+            "TIMEKEEPER_ID": timekeeper_id, "TASK_CODE": task_code,
+            "ACTIVITY_CODE": activity_code, "EXPENSE_CODE": "", "DESCRIPTION": description,
+            "HOURS": hours_to_bill, "RATE_CENTS": hourly_rate, "LINE_ITEM_TOTAL_CENTS": line_item_total
+        }
+        rows.append(row)
+
+    # Expense records (E101 and others)
+    e101_actual_count = random.randint(1, min(3, expense_count)) if expense_count > 0 else 0
+    for _ in range(e101_actual_count):
+        description = "Copying"
+        expense_code = "E101"
+        hours = random.randint(1, 200)
+        rate = random.randint(14, 25)
+        random_day_offset = random.randint(0, num_days - 1)
+        line_item_date = billing_start_date + datetime.timedelta(days=random_day_offset)
+        line_item_total = _line_total_cents(hours, rate)
+        row = {
+            "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id, "LAW_FIRM_ID": law_firm_id,
+            "LINE_ITEM_DATE": line_item_date.strftime("%Y-%m-%d"), "TIMEKEEPER_NAME": "",
+            "TIMEKEEPER_CLASSIFICATION": "", "TIMEKEEPER_ID": "", "TASK_CODE": "",
+            "ACTIVITY_CODE": "", "EXPENSE_CODE": expense_code, "DESCRIPTION": description,
+            "HOURS": hours, "RATE_CENTS": rate, "LINE_ITEM_TOTAL_CENTS": line_item_total
+        }
+        rows.append(row)
+
+    remaining_expense_count = expense_count - e101_actual_count
+    if remaining_expense_count > 0:
+        if not OTHER_EXPENSE_DESCRIPTIONS:
+            pass
+        else:
+            for _ in range(remaining_expense_count):
+                description = random.choice(OTHER_EXPENSE_DESCRIPTIONS)
+                expense_code = EXPENSE_CODES[description]
+                hours = 1
+                rate = random.randint(2500, 20000)
+                random_day_offset = random.randint(0, num_days - 1)
+                line_item_date = billing_start_date + datetime.timedelta(days=random_day_offset)
+                line_item_total = _line_total_cents(hours, rate)
+                row = {
+                    "INVOICE_DESCRIPTION": invoice_desc, "CLIENT_ID": client_id,
+                    "LAW_FIRM_ID": law_firm_id, "LINE_ITEM_DATE": line_item_date.strftime("%Y-%m-%d"),
+                    "TIMEKEEPER_NAME": "", "TIMEKEEPER_CLASSIFICATION": "",
+                    "TIMEKEEPER_ID": "", "TASK_CODE": "", "ACTIVITY_CODE": "",
+                    "EXPENSE_CODE": expense_code, "DESCRIPTION": description,
+                    "HOURS": hours, "RATE_CENTS": rate, "LINE_ITEM_TOTAL_CENTS": line_item_total
+                }
+                rows.append(row)
+
+    # Block Billing
+    if not include_block_billed:
+        rows = [row for row in rows if not ("; " in row["DESCRIPTION"])]
+    elif include_block_billed:
+        if not any('; ' in row['DESCRIPTION'] for row in rows):
+            for _, _, desc in _block_billed_items(task_activity_desc):
+                if len(rows) > 0:
+                    extra = rows[0].copy()
+                    extra['DESCRIPTION'] = desc
+                    rows.insert(0, extra)
+                    break
+    return rows
+
+
+def _generate_invoice(settings, timekeeper_data, task_activity_desc, invoice_desc, billing_start_date, billing_end_date, invoice_number, matter_number, samplers=None):
+    """Generates one invoice (rows, totals and LEDES 1998B text) from the shared settings dict.
+
+    `samplers` is the (task, timekeeper) pair from _build_samplers; it is built
+    here when not supplied.
+    """
+    if samplers is None:
+        samplers = _build_samplers(settings, timekeeper_data, task_activity_desc)
+    spend_agent = settings.get("spend_agent", False)
+    fees = int(settings["fees"])
+    expenses = int(settings["expenses"])
+    fees_used = max(0, fees - 2) if spend_agent else fees
+    expenses_used = max(0, expenses - 1) if spend_agent else expenses
+    rows = _generate_invoice_data(fees_used, expenses_used, timekeeper_data, settings["client_id"], settings["law_firm_id"],
+        invoice_desc, billing_start_date, billing_end_date,
+        task_activity_desc, settings.get("major_task_codes", MAJOR_TASK_CODES), settings["max_daily_hours"], settings["include_block_billed"], None,
+        *samplers
+    )
+    if spend_agent:
+        rows = _ensure_mandatory_lines(rows, timekeeper_data, invoice_desc, settings["client_id"], settings["law_firm_id"], billing_start_date, billing_end_date)
+    invoice = {
+        "invoice_number": invoice_number, "matter_number": matter_number,
+        "client_id": settings["client_id"], "law_firm_id": settings["law_firm_id"],
+        "invoice_desc": invoice_desc,
+        "billing_start_date": billing_start_date, "billing_end_date": billing_end_date,
+        "rows": rows,
+    }
+    _finalize_invoice_totals(invoice)
+    invoice["ledes_lines"] = _create_ledes_1998b_lines(rows, invoice["total_cents"], billing_start_date, billing_end_date, invoice_number, matter_number)
+    invoice["ledes_content"] = _create_ledes_1998b_content(rows, invoice["total_cents"], billing_start_date, billing_end_date,
+                                                           invoice_number, matter_number, invoice["ledes_lines"])
+    return invoice
+
+
+def _finalize_invoice_totals(invoice):
+    """Aggregates the invoice's rows once, after every row has been added, dropped or reassigned.
+
+    The totals are cached on the invoice; the LEDES writer, PDF and email body
+    all read them from there instead of summing again.
+    """
+    fee_cents = expense_cents = 0
+    fee_hours = 0.0
+    for row in invoice["rows"]:
+        if row["EXPENSE_CODE"]:
+            expense_cents += row["LINE_ITEM_TOTAL_CENTS"]
+        else:
+            fee_cents += row["LINE_ITEM_TOTAL_CENTS"]
+            fee_hours += float(row["HOURS"])
+    invoice["fee_cents"] = fee_cents
+    invoice["expense_cents"] = expense_cents
+    invoice["total_cents"] = fee_cents + expense_cents
+    invoice["fee_hours"] = round(fee_hours, 1)
+    return invoice
+
+
+# --- Batch manifests: one row per matter ---
+MANIFEST_REQUIRED_COLUMNS = ["CLIENT_ID", "LAW_FIRM_ID", "MATTER_NUMBER"]
+MANIFEST_OPTIONAL_COLUMNS = ["INVOICE_NUMBER", "BILLING_START_DATE", "BILLING_END_DATE", "INVOICE_DESCRIPTION",
+                             "FEES", "EXPENSES", "NUM_INVOICES", "TIMEKEEPERS"]
+
+
+def _manifest_digest(data):
+    """Stable identifier for an uploaded manifest, used to key resume progress."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def _load_manifest(data, file_name, defaults=None):
+    """Parses a CSV or JSON batch manifest into a list of entry dicts.
+
+    JSON manifests are either a list of objects or {"matters": [...]}, using the
+    same keys as the CSV columns. Each row's billing period is checked after
+    blank dates fall back to `defaults` (the billing_start_date and
+    billing_end_date _run_manifest_jobs will use). Raises ValueError
+    describing the first bad row.
+    """
+    defaults = defaults or {}
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    if file_name.lower().endswith(".json"):
+        raw = json.loads(data)
+        if isinstance(raw, dict):
+            raw = raw.get("matters", [])
+        if not isinstance(raw, list):
+            raise ValueError("JSON manifest must be a list of matters or an object with a 'matters' list.")
+        for n, rec in enumerate(raw, start=1):
+            if not isinstance(rec, dict):
+                raise ValueError(f"Manifest row {n} must be an object, got {type(rec).__name__}.")
+        records = [{str(k).strip().upper(): v for k, v in rec.items()} for rec in raw]
+    else:
+        import pandas as pd
+        df = pd.read_csv(io.StringIO(data), dtype=str, keep_default_na=False)
+        df.columns = [str(c).strip().upper() for c in df.columns]
+        records = df.to_dict(orient="records")
+
+    entries = []
+    for n, rec in enumerate(records, start=1):
+        missing = [col for col in MANIFEST_REQUIRED_COLUMNS if not str(rec.get(col, "") or "").strip()]
+        if missing:
+            raise ValueError(f"Manifest row {n} is missing: {', '.join(missing)}")
+        entry = {col: str(rec[col]).strip() for col in MANIFEST_REQUIRED_COLUMNS}
+        try:
+            for col in ("BILLING_START_DATE", "BILLING_END_DATE"):
+                value = str(rec.get(col, "") or "").strip()
+                entry[col] = datetime.date.fromisoformat(value) if value else None
+            for col in ("FEES", "EXPENSES", "NUM_INVOICES"):
+                value = str(rec.get(col, "") or "").strip()
+                entry[col] = int(float(value)) if value else None
+        except ValueError as e:
+            raise ValueError(f"Manifest row {n}: {e}") from e
+        start = entry["BILLING_START_DATE"] or defaults.get("billing_start_date")
+        end = entry["BILLING_END_DATE"] or defaults.get("billing_end_date")
+        if start and end and start > end:
+            raise ValueError(f"Manifest row {n}: billing period starts {start} after it ends {end}.")
+        entry["INVOICE_NUMBER"] = str(rec.get("INVOICE_NUMBER", "") or "").strip()
+        entry["INVOICE_DESCRIPTION"] = str(rec.get("INVOICE_DESCRIPTION", "") or "").strip()
+        timekeepers = rec.get("TIMEKEEPERS", "") or ""
+        if isinstance(timekeepers, list):
+            timekeepers = ";".join(str(t) for t in timekeepers)
+        entry["TIMEKEEPERS"] = ";".join(t.strip() for t in str(timekeepers).split(";") if t.strip())
+        entries.append(entry)
+    return entries
+
+
+def _expand_manifest(entries):
+    """Expands manifest entries into one job per invoice, each with a unique resume key."""
+    jobs = []
+    seen = set()
+    for entry in entries:
+        base = entry["INVOICE_NUMBER"] or entry["MATTER_NUMBER"]
+        for i in range(max(1, entry["NUM_INVOICES"] or 1)):
+            invoice_number = f"{base}-{i+1}"
+            key = f"{entry['MATTER_NUMBER']}|{invoice_number}"
+            if key in seen:
+                raise ValueError(f"Manifest produces invoice {invoice_number} for matter {entry['MATTER_NUMBER']} more than once.")
+            seen.add(key)
+            jobs.append({"key": key, "entry": entry, "invoice_number": invoice_number})
+    return jobs
+
+
+def _timekeeper_subset_resolver(timekeeper_data):
+    """Returns a function mapping a TIMEKEEPERS cell (IDs or names, ';'-separated) to roster rows.
+
+    The roster index and every resolved subset are built once and shared by all
+    jobs in the batch.
+    """
+    index = {}
+    for tk in timekeeper_data:
+        index.setdefault(str(tk.get("TIMEKEEPER_ID", "")).strip().lower(), tk)
+        index.setdefault(str(tk.get("TIMEKEEPER_NAME", "")).strip().lower(), tk)
+    subsets = {"": timekeeper_data}
+
+    def resolve(spec):
+        if spec not in subsets:
+            subset = []
+            for token in spec.split(";"):
+                tk = index.get(token.strip().lower())
+                if tk is None:
+                    raise ValueError(f"Timekeeper '{token}' from the manifest is not in the timekeeper CSV.")
+                subset.append(tk)
+            subsets[spec] = subset
+        return subsets[spec]
+    return resolve
+
+
+def _run_manifest_jobs(jobs, timekeeper_data, task_activity_desc, defaults, completed=(), seeds=None):
+    """Generates every manifest job not already in `completed`, yielding (job, invoice).
+
+    `defaults` holds the app settings (fees, expenses, dates, description, ...)
+    used wherever a manifest row leaves a column blank. Callers record a job's
+    key as completed once its output has been delivered, so a rerun with the
+    same set picks up at the first unfinished invoice. `seeds` maps job keys
+    to seeds recorded by an earlier run, so retried invoices come out the same.
+    """
+    resolve_timekeepers = _timekeeper_subset_resolver(timekeeper_data)
+    task_sampler = _build_samplers(defaults, [], task_activity_desc)[0]
+    timekeeper_samplers = {}
+    for job in jobs:
+        if job["key"] in completed:
+            continue
+        entry = job["entry"]
+        settings = dict(defaults)
+        settings["client_id"] = entry["CLIENT_ID"]
+        settings["law_firm_id"] = entry["LAW_FIRM_ID"]
+        if entry["FEES"] is not None:
+            settings["fees"] = entry["FEES"]
+        if entry["EXPENSES"] is not None:
+            settings["expenses"] = entry["EXPENSES"]
+        timekeepers = resolve_timekeepers(entry["TIMEKEEPERS"])
+        if entry["TIMEKEEPERS"] not in timekeeper_samplers:
+            timekeeper_samplers[entry["TIMEKEEPERS"]] = _build_timekeeper_sampler(timekeepers, defaults.get("classification_weights"))
+        seed = (seeds or {}).get(job["key"]) or _new_seed()
+        _seed_generation(seed)
+        invoice = _generate_invoice(
+            settings, timekeepers, task_activity_desc,
+            entry["INVOICE_DESCRIPTION"] or defaults["invoice_desc"],
+            entry["BILLING_START_DATE"] or defaults["billing_start_date"],
+            entry["BILLING_END_DATE"] or defaults["billing_end_date"],
+            job["invoice_number"], entry["MATTER_NUMBER"],
+            (task_sampler, timekeeper_samplers[entry["TIMEKEEPERS"]]),
+        )
+        invoice["seed"] = seed
+        yield job, invoice
+
+
+# --- Billing periods and parallel generation ---
+def _billing_periods(billing_start_date, billing_end_date, num_periods):
+    """Returns (start, end) for every period up front, newest to oldest.
+
+    The first period is the one selected in the app; each earlier one runs up
+    to the day before the next period starts and back to the 1st of that month.
+    """
+    periods = [(billing_start_date, billing_end_date)]
+    if num_periods > 1:
+        end = billing_start_date - datetime.timedelta(days=1)
+        periods.append((end.replace(day=1), end))
+        year, month = end.year, end.month
+        for _ in range(num_periods - 2):
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+            last_day = calendar.monthrange(year, month)[1]
+            periods.append((datetime.date(year, month, 1), datetime.date(year, month, last_day)))
+    return periods
+
+
+def _invoice_units(descriptions, billing_start_date, billing_end_date, num_invoices, multiple_periods, invoice_number_base, matter_number, seeds=None):
+    """Works out every invoice of a run up front as an independent unit for _generate_invoices.
+
+    With `multiple_periods` each unit gets its own month (newest first) and the
+    descriptions are used in turn, cycling when there are fewer than periods;
+    otherwise every unit shares the period and the first description. Each unit gets a fresh seed unless `seeds` supplies them.
+    """
+    if multiple_periods:
+        periods = _billing_periods(billing_start_date, billing_end_date, num_invoices)
+    else:
+        periods = [(billing_start_date, billing_end_date)] * num_invoices
+    return [{
+        "invoice_desc": descriptions[i % len(descriptions)] if multiple_periods else descriptions[0],
+        "billing_start_date": period_start, "billing_end_date": period_end,
+        "invoice_number": f"{invoice_number_base}-{i+1}", "matter_number": matter_number,
+        "seed": seeds[i] if seeds else _new_seed(),
+    } for i, (period_start, period_end) in enumerate(periods)]
+
+
+def _spawn_process_pool(max_workers=None, initializer=None, initargs=()):
+    """ProcessPoolExecutor for generation and rendering work.
+
+    Uses spawn rather than fork: both the Streamlit server and the job server
+    are multi-threaded, and a forked child can inherit a held lock.
+    """
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"),
+        initializer=initializer, initargs=initargs,
+    )
+
+
+_worker_shared = None
+
+
+def _init_generation_worker(settings, timekeeper_data, task_activity_desc, samplers):
+    # Shared inputs are sent once per worker instead of once per invoice.
+    global _worker_shared
+    _worker_shared = (settings, timekeeper_data, task_activity_desc, samplers)
+
+
+def _generate_invoice_unit(unit):
+    settings, timekeeper_data, task_activity_desc, samplers = _worker_shared
+    _seed_generation(unit["seed"])
+    invoice = _generate_invoice(settings, timekeeper_data, task_activity_desc, unit["invoice_desc"],
+        unit["billing_start_date"], unit["billing_end_date"], unit["invoice_number"], unit["matter_number"], samplers)
+    invoice["seed"] = unit["seed"]
+    return invoice
+
+
+def _generate_invoices(settings, timekeeper_data, task_activity_desc, units, max_workers=None):
+    """Yields one invoice per unit, in unit order.
+
+    Each unit (invoice_desc, billing dates, invoice/matter number and seed) is
+    independent, so units are spread over a process pool when there is more
+    than one CPU and enough of them to pay for starting workers.
+    """
+    max_workers = min(max_workers or os.cpu_count() or 1, len(units))
+    samplers = _build_samplers(settings, timekeeper_data, task_activity_desc)
+    if max_workers < 2 or len(units) < 4:
+        _init_generation_worker(settings, timekeeper_data, task_activity_desc, samplers)
+        for unit in units:
+            yield _generate_invoice_unit(unit)
+        return
+    with _spawn_process_pool(max_workers, _init_generation_worker,
+                             (settings, timekeeper_data, task_activity_desc, samplers)) as executor:
+        chunksize = max(1, len(units) // (max_workers * 4))
+        yield from executor.map(_generate_invoice_unit, units, chunksize=chunksize)
+
+
+# --- Summary rollups ---
+TIMEKEEPER_SUMMARY_KEYS = ["TIMEKEEPER_ID", "TIMEKEEPER_NAME", "TIMEKEEPER_CLASSIFICATION"]
+TASK_SUMMARY_KEYS = ["TASK_CODE"]
+
+
+def _rollup(fees, keys):
+    summary = fees.groupby(keys, sort=False, as_index=False, dropna=False).agg(
+        HOURS=("HOURS", "sum"), FEES_CENTS=("LINE_ITEM_TOTAL_CENTS", "sum"))
+    summary["HOURS"] = summary["HOURS"].round(1)
+    summary["BLENDED_RATE_CENTS"] = (summary["FEES_CENTS"] / summary["HOURS"].where(summary["HOURS"] > 0)).round().fillna(0).astype("int64")
+    return summary
+
+
+def _summarize_invoices(invoices):
+    """Per-timekeeper and per-task rollups (hours, fees, blended rate) for a batch.
+
+    Fee lines from every invoice are grouped in one pass; each invoice's share
+    is cached on invoice["summaries"] as lists of dicts, and the batch-wide
+    frames are built from those (see _combine_invoice_summaries) rather than
+    from the rows again.
+    Returns {"timekeepers": DataFrame, "tasks": DataFrame}.
+    """
+    import pandas as pd
+    columns = ["INVOICE_INDEX"] + TIMEKEEPER_SUMMARY_KEYS + TASK_SUMMARY_KEYS + ["HOURS", "LINE_ITEM_TOTAL_CENTS"]
+    fees = pd.DataFrame.from_records(
+        [(n, r["TIMEKEEPER_ID"], r["TIMEKEEPER_NAME"], r["TIMEKEEPER_CLASSIFICATION"], r["TASK_CODE"],
+          float(r["HOURS"]), r["LINE_ITEM_TOTAL_CENTS"])
+         for n, invoice in enumerate(invoices) for r in invoice["rows"] if not r["EXPENSE_CODE"]],
+        columns=columns,
+    )
+    # Explicit dtypes so a batch without fee lines still rolls up (to empty frames).
+    fees = fees.astype({"INVOICE_INDEX": "int64", "HOURS": "float64", "LINE_ITEM_TOTAL_CENTS": "int64"})
+    # Blank tk_info.csv cells arrive as NaN; they must still count towards the invoice's totals.
+    key_columns = TIMEKEEPER_SUMMARY_KEYS + TASK_SUMMARY_KEYS
+    fees[key_columns] = fees[key_columns].fillna("")
+    by_invoice = {
+        "timekeepers": _rollup(fees, ["INVOICE_INDEX"] + TIMEKEEPER_SUMMARY_KEYS),
+        "tasks": _rollup(fees, ["INVOICE_INDEX"] + TASK_SUMMARY_KEYS),
+    }
+    for invoice in invoices:
+        invoice["summaries"] = {"timekeepers": [], "tasks": []}
+    for name, summary in by_invoice.items():
+        for n, part in summary.groupby("INVOICE_INDEX", sort=False):
+            invoices[n]["summaries"][name] = part.drop(columns="INVOICE_INDEX").to_dict(orient="records")
+    return _combine_invoice_summaries(invoices)
+
+
+def _combine_invoice_summaries(invoices):
+    """Batch-wide rollups from the invoice["summaries"] cached by _summarize_invoices.
+
+    Only the per-invoice groups are read, never the rows, so invoices that
+    were summarized one at a time (as a manifest run delivers them) roll up
+    into a batch dashboard without a second scan.
+    """
+    import pandas as pd
+    batch = {}
+    for name, keys in (("timekeepers", TIMEKEEPER_SUMMARY_KEYS), ("tasks", TASK_SUMMARY_KEYS)):
+        per_invoice = pd.DataFrame.from_records(
+            [group for invoice in invoices for group in invoice["summaries"][name]],
+            columns=keys + ["HOURS", "FEES_CENTS", "BLENDED_RATE_CENTS"],
+        ).astype({"HOURS": "float64", "FEES_CENTS": "int64"}).rename(columns={"FEES_CENTS": "LINE_ITEM_TOTAL_CENTS"})
+        batch[name] = _rollup(per_invoice, keys).sort_values("FEES_CENTS", ascending=False, ignore_index=True)
+    return batch
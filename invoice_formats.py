@@ -0,0 +1,178 @@
+"""Output-format registry.
+
+Every writer consumes the same prepared row model: the invoice dict from
+_generate_invoice, whose rows were formatted once into `ledes_lines`
+(LEDES_1998B_FIELDS order). Per-invoice writers turn one invoice into one
+file; bulk writers turn the whole batch into one file for analytics.
+_write_output_formats drives all selected formats in a single pass over the
+batch.
+"""
+import csv
+import importlib.util
+import io
+import xml.etree.ElementTree as ET
+
+from invoice_engine import LEDES_1998B_FIELDS, _format_cents
+
+OUTPUT_FORMATS = {}
+DEFAULT_OUTPUT_FORMATS = ["LEDES 1998B"]
+
+# LEDES98BI V2 appends these to the 1998B fields.
+LEDES_1998BI_EXTRA_FIELDS = [
+    "PO_NUMBER", "CLIENT_TAX_ID", "MATTER_NAME", "INVOICE_TAX_TOTAL", "INVOICE_NET_TOTAL", "INVOICE_CURRENCY",
+    "TIMEKEEPER_LAST_NAME", "TIMEKEEPER_FIRST_NAME", "ACCOUNT_TYPE", "LAW_FIRM_NAME", "LAW_FIRM_ADDRESS_1",
+    "LAW_FIRM_ADDRESS_2", "LAW_FIRM_CITY", "LAW_FIRM_STATEorREGION", "LAW_FIRM_POSTCODE", "LAW_FIRM_COUNTRY",
+    "CLIENT_NAME", "CLIENT_ADDRESS_1", "CLIENT_ADDRESS_2", "CLIENT_CITY", "CLIENT_STATEorREGION", "CLIENT_POSTCODE",
+    "CLIENT_COUNTRY", "LINE_ITEM_TAX_RATE", "LINE_ITEM_TAX_TOTAL", "LINE_ITEM_TAX_TYPE",
+    "INVOICE_REPORTED_TAX_TOTAL", "INVOICE_TAX_CURRENCY",
+]
+BATCH_NUMERIC_FIELDS = ["INVOICE_TOTAL", "LINE_ITEM_NUMBER_OF_UNITS", "LINE_ITEM_ADJUSTMENT_AMOUNT",
+                        "LINE_ITEM_TOTAL", "LINE_ITEM_UNIT_COST"]
+BATCH_DATE_FIELDS = ["INVOICE_DATE", "BILLING_START_DATE", "BILLING_END_DATE", "LINE_ITEM_DATE"]
+
+_FIELD_INDEX = {field: i for i, field in enumerate(LEDES_1998B_FIELDS)}
+
+
+def _output_format(name, extension, mime, bulk=False, available=True):
+    """Registers a writer: fn(invoice) -> bytes, or fn(invoices) -> bytes when `bulk`."""
+    def register(writer):
+        OUTPUT_FORMATS[name] = {"writer": writer, "extension": extension, "mime": mime, "bulk": bulk, "available": available}
+        return writer
+    return register
+
+
+def _available_output_formats():
+    return [name for name, spec in OUTPUT_FORMATS.items() if spec["available"]]
+
+
+def _format_file_name(name, invoice=None):
+    spec = OUTPUT_FORMATS[name]
+    slug = name.replace("LEDES ", "LEDES_").replace(" ", "_")
+    if spec["bulk"]:
+        return f"ledes_batch.{spec['extension']}"
+    return f"{slug}_{invoice['invoice_number']}.{spec['extension']}"
+
+
+@_output_format("LEDES 1998B", "txt", "text/plain")
+def _write_ledes_1998b(invoice):
+    return invoice["ledes_content"].encode("utf-8")
+
+
+@_output_format("LEDES 1998BI", "txt", "text/plain")
+def _write_ledes_1998bi(invoice):
+    total = _format_cents(invoice["total_cents"])
+    lines = ["LEDES98BI V2[]", "|".join(LEDES_1998B_FIELDS + LEDES_1998BI_EXTRA_FIELDS) + "[]"]
+    name_index = _FIELD_INDEX["TIMEKEEPER_NAME"]
+    for line in invoice["ledes_lines"]:
+        first_name, _, last_name = line[name_index].rpartition(" ")
+        extra = [
+            "", "", invoice["invoice_desc"], "0.00", total, "USD",
+            last_name, first_name, "O", "", "",
+            "", "", "", "", "US",
+            "", "", "", "", "", "",
+            "US", "0.0000", "0.00", "",
+            "0.00", "USD",
+        ]
+        lines.append("|".join(line + extra) + "[]")
+    return "\n".join(lines).encode("utf-8")
+
+
+@_output_format("LEDES 2000", "xml", "application/xml")
+def _write_ledes_2000(invoice):
+    """LEDES 2000 XML: firm > client > invoice > matter with fee and expense items."""
+    def field(line, name):
+        return line[_FIELD_INDEX[name]]
+
+    root = ET.Element("ledesxmlebilling", version="2000")
+    firm = ET.SubElement(root, "firm")
+    ET.SubElement(firm, "lf_id").text = invoice["law_firm_id"]
+    client = ET.SubElement(firm, "client")
+    ET.SubElement(client, "cl_id").text = invoice["client_id"]
+    inv = ET.SubElement(client, "invoice")
+    ET.SubElement(inv, "inv_id").text = invoice["invoice_number"]
+    ET.SubElement(inv, "inv_date").text = f"{invoice['billing_end_date']:%Y%m%d}"
+    ET.SubElement(inv, "inv_start_date").text = f"{invoice['billing_start_date']:%Y%m%d}"
+    ET.SubElement(inv, "inv_end_date").text = f"{invoice['billing_end_date']:%Y%m%d}"
+    ET.SubElement(inv, "inv_desc").text = invoice["invoice_desc"]
+    ET.SubElement(inv, "inv_currency").text = "USD"
+    ET.SubElement(inv, "inv_total_net_due").text = _format_cents(invoice["total_cents"])
+    matter = ET.SubElement(inv, "matter")
+    ET.SubElement(matter, "lf_matter_id").text = invoice["matter_number"]
+    ET.SubElement(matter, "cl_matter_id").text = invoice["matter_number"]
+    ET.SubElement(matter, "matter_total_fees").text = _format_cents(invoice["fee_cents"])
+    ET.SubElement(matter, "matter_total_expenses").text = _format_cents(invoice["expense_cents"])
+    for line in invoice["ledes_lines"]:
+        if field(line, "EXP/FEE/INV_ADJ_TYPE") == "F":
+            item = ET.SubElement(matter, "fee")
+            ET.SubElement(item, "fee_id").text = field(line, "LINE_ITEM_NUMBER")
+            ET.SubElement(item, "tk_id").text = field(line, "TIMEKEEPER_ID")
+            ET.SubElement(item, "tk_name").text = field(line, "TIMEKEEPER_NAME")
+            ET.SubElement(item, "tk_level").text = field(line, "TIMEKEEPER_CLASSIFICATION")
+            ET.SubElement(item, "charge_date").text = field(line, "LINE_ITEM_DATE")
+            ET.SubElement(item, "acca_task").text = field(line, "LINE_ITEM_TASK_CODE")
+            ET.SubElement(item, "acca_activity").text = field(line, "LINE_ITEM_ACTIVITY_CODE")
+        else:
+            item = ET.SubElement(matter, "expense")
+            ET.SubElement(item, "expense_id").text = field(line, "LINE_ITEM_NUMBER")
+            ET.SubElement(item, "charge_date").text = field(line, "LINE_ITEM_DATE")
+            ET.SubElement(item, "acca_expense").text = field(line, "LINE_ITEM_EXPENSE_CODE")
+        ET.SubElement(item, "charge_desc").text = field(line, "LINE_ITEM_DESCRIPTION")
+        ET.SubElement(item, "units").text = field(line, "LINE_ITEM_NUMBER_OF_UNITS")
+        ET.SubElement(item, "rate").text = field(line, "LINE_ITEM_UNIT_COST")
+        ET.SubElement(item, "discount_amount").text = field(line, "LINE_ITEM_ADJUSTMENT_AMOUNT")
+        ET.SubElement(item, "total_amount").text = field(line, "LINE_ITEM_TOTAL")
+    buffer = io.BytesIO()
+    ET.ElementTree(root).write(buffer, encoding="utf-8", xml_declaration=True)
+    return buffer.getvalue()
+
+
+@_output_format("CSV (batch)", "csv", "text/csv", bulk=True)
+def _write_batch_csv(invoices):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(LEDES_1998B_FIELDS)
+    for invoice in invoices:
+        writer.writerows(invoice["ledes_lines"])
+    return buffer.getvalue().encode("utf-8")
+
+
+@_output_format("Parquet (batch)", "parquet", "application/octet-stream", bulk=True, available=importlib.util.find_spec("pyarrow") is not None)  # Parquet export is optional
+def _write_batch_parquet(invoices):
+    """Typed batch table: amounts and units as float64, dates as date32."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+    columns = list(zip(*(line for invoice in invoices for line in invoice["ledes_lines"]))) or [()] * len(LEDES_1998B_FIELDS)
+    arrays = []
+    for field, values in zip(LEDES_1998B_FIELDS, columns):
+        array = pa.array(values, type=pa.string())
+        if field in BATCH_NUMERIC_FIELDS:
+            array = array.cast(pa.float64())
+        elif field in BATCH_DATE_FIELDS:
+            array = pc.strptime(array, format="%Y%m%d", unit="s").cast(pa.date32())
+        elif field == "LINE_ITEM_NUMBER":
+            array = array.cast(pa.int32())
+        arrays.append(array)
+    buffer = io.BytesIO()
+    pq.write_table(pa.Table.from_arrays(arrays, names=LEDES_1998B_FIELDS), buffer)
+    return buffer.getvalue()
+
+
+def _write_output_formats(invoices, names):
+    """Writes every selected format for a batch in one pass over its invoices.
+
+    Returns (per_invoice, bulk): per_invoice[i] is the [(filename, bytes), ...]
+    list for invoices[i]; bulk is the [(filename, bytes), ...] list of batch
+    files. Raises ValueError for unknown or unavailable formats.
+    """
+    for name in names:
+        if name not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{name}'. Available: {', '.join(_available_output_formats())}")
+        if not OUTPUT_FORMATS[name]["available"]:
+            raise ValueError(f"Output format '{name}' needs an optional dependency that is not installed.")
+    invoice_formats = [(name, OUTPUT_FORMATS[name]["writer"]) for name in names if not OUTPUT_FORMATS[name]["bulk"]]
+    bulk_formats = [(name, OUTPUT_FORMATS[name]["writer"]) for name in names if OUTPUT_FORMATS[name]["bulk"]]
+    per_invoice = [[(_format_file_name(name, invoice), writer(invoice)) for name, writer in invoice_formats]
+                   for invoice in invoices]
+    bulk = [(_format_file_name(name), writer(invoices)) for name, writer in bulk_formats] if invoices else []
+    return per_invoice, bulk
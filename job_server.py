@@ -0,0 +1,457 @@
+"""Local HTTP job service around the invoice generation core.
+
+Jobs are queued in a SQLite file, so queued work survives a restart. Worker
+processes run them and the finished artifacts are served by job ID. Only the
+standard library is used on top of the generation core, and the server binds
+to localhost by default, so it runs fully offline.
+
+    python job_server.py --db jobs.sqlite3 --port 8765 --workers 4
+
+    POST /jobs                       JSON settings (see _job_settings) -> 202 {"job_id": ...}
+    GET  /jobs/<id>                  status, timings, seeds and artifact names
+    GET  /jobs/<id>/artifacts/<name> one artifact
+    GET  /jobs/<id>/artifacts.zip    every artifact of the job
+    GET  /metrics                    queue depth by status and throughput
+"""
+import argparse
+import contextlib
+import datetime
+import hashlib
+import http.server
+import io
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+
+from invoice_engine import (
+    DEFAULT_TASK_ACTIVITY_DESC, MAJOR_TASK_CODES, DEFAULT_MAJOR_TASK_SHARE,
+    DEFAULT_CLIENT_ID, DEFAULT_LAW_FIRM_ID, _build_samplers, _check_timekeeper_rates, _parse_weights, _generate_invoices, _invoice_units, _spawn_process_pool, _summarize_invoices,
+)
+from invoice_formats import DEFAULT_OUTPUT_FORMATS, OUTPUT_FORMATS, _write_output_formats
+from synthetic_roster import _synthetic_roster
+
+JOB_STATUSES = ["queued", "running", "done", "failed"]
+THROUGHPUT_WINDOW_SECONDS = 60
+ARTIFACT_CONTENT_TYPES = {"txt": "text/plain; charset=utf-8", "xml": "application/xml", "csv": "text/csv; charset=utf-8",
+                          "pdf": "application/pdf"}
+TIMEKEEPER_REQUIRED_KEYS = ["TIMEKEEPER_NAME", "TIMEKEEPER_CLASSIFICATION", "TIMEKEEPER_ID", "RATE"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    params TEXT NOT NULL,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    invoice_count INTEGER NOT NULL DEFAULT 0,
+    seeds TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, submitted_at);
+CREATE TABLE IF NOT EXISTS artifacts (
+    job_id TEXT NOT NULL REFERENCES jobs (id),
+    name TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (job_id, name)
+);
+"""
+
+
+def _parse_date(value, field):
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"{field} must be an ISO date (YYYY-MM-DD), got '{value}'.")
+
+
+def _job_settings(params):
+    """Validates a job request and returns (settings, timekeepers, run) for _run_generation_job.
+
+    Accepts the same settings as the app's Invoice Inputs and Advanced
+    Settings tabs: client_id, law_firm_id, matter_number, invoice_number,
+    billing_start_date, billing_end_date, invoice_desc (str or list, reused in
+    turn across periods), fees, expenses, max_daily_hours, include_block_billed,
+    spend_agent, major_task_share, major_task_codes, code_weights,
+    classification_weights, num_invoices, multiple_periods, output_formats
+    (names in invoice_formats.OUTPUT_FORMATS) and include_pdf, plus
+    `timekeepers` (list of roster records) or `synthetic_roster` (roster
+    size), and optional `seeds` (one per invoice) for reproducible output.
+    Raises ValueError.
+    """
+    if not isinstance(params, dict):
+        raise ValueError("Job parameters must be a JSON object.")
+    timekeepers = params.get("timekeepers")
+    if not timekeepers and params.get("synthetic_roster"):
+        try:
+            timekeepers = _synthetic_roster(int(params["synthetic_roster"]))
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"synthetic_roster: {e}")
+    if not timekeepers or not isinstance(timekeepers, list):
+        raise ValueError("timekeepers must be a non-empty list of roster records (or set synthetic_roster).")
+    for tk in timekeepers:
+        if not isinstance(tk, dict) or not all(key in tk for key in TIMEKEEPER_REQUIRED_KEYS):
+            raise ValueError(f"Every timekeeper must have: {', '.join(TIMEKEEPER_REQUIRED_KEYS)}")
+    _check_timekeeper_rates(timekeepers)
+
+    def _int(field, default, minimum=0):
+        try:
+            value = int(params.get(field, default))
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be an integer.")
+        if value < minimum:
+            raise ValueError(f"{field} must be at least {minimum}.")
+        return value
+
+    def _float(field, default, minimum, maximum):
+        try:
+            value = float(params.get(field, default))
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number.")
+        if not minimum <= value <= maximum:
+            raise ValueError(f"{field} must be between {minimum} and {maximum}.")
+        return value
+
+    def _weights(field):
+        value = params.get(field) or {}
+        if isinstance(value, str):
+            return _parse_weights(value)
+        if not isinstance(value, dict):
+            raise ValueError(f"{field} must be an object of CODE: weight or a 'CODE=weight, ...' string.")
+        try:
+            weights = {str(k): float(v) for k, v in value.items()}
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} weights must be numbers.")
+        if any(not weight >= 0 for weight in weights.values()):
+            raise ValueError(f"{field} weights must not be negative.")
+        return weights
+
+    def _strings(field, default, separator):
+        value = params.get(field, default)
+        if isinstance(value, str):
+            value = value.split(separator)
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            raise ValueError(f"{field} must be a string or a list of strings.")
+        return [item.strip() for item in value if item.strip()]
+
+    today = datetime.date.today()
+    default_end = today.replace(day=1) - datetime.timedelta(days=1)
+    billing_start_date = _parse_date(params.get("billing_start_date", default_end.replace(day=1)), "billing_start_date")
+    billing_end_date = _parse_date(params.get("billing_end_date", default_end), "billing_end_date")
+    if billing_start_date > billing_end_date:
+        raise ValueError("billing_start_date must not be after billing_end_date.")
+    descriptions = _strings("invoice_desc", "Professional Services Rendered", "\n")
+    if not descriptions:
+        raise ValueError("invoice_desc must contain at least one description.")
+
+    settings = {
+        "client_id": str(params.get("client_id", DEFAULT_CLIENT_ID)),
+        "law_firm_id": str(params.get("law_firm_id", DEFAULT_LAW_FIRM_ID)),
+        "fees": _int("fees", 20, 1),
+        "expenses": _int("expenses", 5),
+        "max_daily_hours": _int("max_daily_hours", 16, 1),
+        "include_block_billed": bool(params.get("include_block_billed", True)),
+        "spend_agent": bool(params.get("spend_agent", False)),
+        "major_task_share": _float("major_task_share", DEFAULT_MAJOR_TASK_SHARE, 0, 1),
+        "major_task_codes": set(_strings("major_task_codes", sorted(MAJOR_TASK_CODES), ",")),
+        "code_weights": _weights("code_weights"),
+        "classification_weights": _weights("classification_weights"),
+    }
+    run = {
+        "descriptions": descriptions,
+        "billing_start_date": billing_start_date, "billing_end_date": billing_end_date,
+        "num_invoices": _int("num_invoices", 1, 1),
+        "multiple_periods": bool(params.get("multiple_periods", False)),
+        "invoice_number": str(params.get("invoice_number", "2025MMM-XXXXXX")),
+        "matter_number": str(params.get("matter_number", "2025-XXXXXX")),
+        "include_pdf": bool(params.get("include_pdf", False)),
+        "output_formats": params.get("output_formats", DEFAULT_OUTPUT_FORMATS),
+        "seeds": params.get("seeds"),
+    }
+    if not isinstance(run["output_formats"], list):
+        raise ValueError("output_formats must be a list of format names.")
+    for name in run["output_formats"]:
+        if not isinstance(name, str) or name not in OUTPUT_FORMATS or not OUTPUT_FORMATS[name]["available"]:
+            raise ValueError(f"Unknown or unavailable output format '{name}'.")
+    if run["multiple_periods"] and len(descriptions) > run["num_invoices"]:
+        raise ValueError(f"multiple_periods takes at most one invoice_desc per period ({run['num_invoices']}), got {len(descriptions)}.")
+    if run["seeds"] is not None and (not isinstance(run["seeds"], list) or len(run["seeds"]) != run["num_invoices"]
+                                     or not all(isinstance(seed, int) and not isinstance(seed, bool) for seed in run["seeds"])):
+        raise ValueError("seeds must be a list with one integer per invoice.")
+    # Weights that leave nothing to draw (all zero) fail here, before the job is queued.
+    try:
+        _build_samplers(settings, timekeepers, DEFAULT_TASK_ACTIVITY_DESC)
+    except ValueError as e:
+        raise ValueError(f"code_weights/classification_weights: {e}")
+    return settings, timekeepers, run
+
+
+def _run_generation_job(params):
+    """Runs one job in a worker process; returns (seeds, [(artifact_name, bytes), ...])."""
+    settings, timekeepers, run = _job_settings(params)
+    units = _invoice_units(run["descriptions"], run["billing_start_date"], run["billing_end_date"], run["num_invoices"],
+                           run["multiple_periods"], run["invoice_number"], run["matter_number"], run["seeds"])
+    # The server already runs one job per worker process, so each job generates sequentially.
+    invoices = list(_generate_invoices(settings, timekeepers, DEFAULT_TASK_ACTIVITY_DESC, units, max_workers=1))
+    format_files, bulk_files = _write_output_formats(invoices, run["output_formats"])
+    artifacts = [artifact for files in format_files for artifact in files] + bulk_files
+    if run["include_pdf"]:
+        from invoice_pdf import _create_pdf_volumes
+        _summarize_invoices(invoices)
+        for invoice in invoices:
+            pdf = _create_pdf_volumes(invoice["rows"], invoice["total_cents"], invoice["invoice_number"],
+                invoice["billing_end_date"], invoice["billing_start_date"], invoice["billing_end_date"],
+                invoice["client_id"], invoice["law_firm_id"], invoice.get("summaries"), max_workers=1)[0]
+            artifacts.append((f"Invoice_{invoice['invoice_number']}.pdf", pdf))
+    return [unit["seed"] for unit in units], artifacts
+
+
+class _JobQueue:
+    """Persistent job queue in one SQLite file; every call uses its own short-lived connection."""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # Jobs interrupted by a shutdown go back to the front of the queue.
+            conn.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, params):
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute("INSERT INTO jobs (id, status, params, submitted_at) VALUES (?, 'queued', ?, ?)",
+                         (job_id, json.dumps(params), time.time()))
+        return job_id
+
+    def claim(self):
+        """Atomically moves the oldest queued job to running; returns (job_id, params) or None."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT id, params FROM jobs WHERE status = 'queued' ORDER BY submitted_at LIMIT 1").fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), row["id"]))
+            conn.execute("COMMIT")
+        return row["id"], json.loads(row["params"])
+
+    def finish(self, job_id, seeds, artifacts):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT OR REPLACE INTO artifacts (job_id, name, sha256, data) VALUES (?, ?, ?, ?)",
+                             [(job_id, name, hashlib.sha256(data).hexdigest(), data) for name, data in artifacts])
+            conn.execute("UPDATE jobs SET status = 'done', finished_at = ?, invoice_count = ?, seeds = ? WHERE id = ?",
+                         (time.time(), len(seeds), json.dumps(seeds), job_id))
+            conn.execute("COMMIT")
+
+    def fail(self, job_id, error):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = 'failed', finished_at = ?, error = ? WHERE id = ?",
+                         (time.time(), error, job_id))
+
+    def job(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT id, status, submitted_at, started_at, finished_at, invoice_count, seeds, error "
+                               "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            names = [r["name"] for r in conn.execute("SELECT name FROM artifacts WHERE job_id = ? ORDER BY rowid", (job_id,))]
+        job = dict(row)
+        job["seeds"] = json.loads(job["seeds"]) if job["seeds"] else None
+        job["artifacts"] = names
+        return job
+
+    def artifacts(self, job_id, name=None):
+        query, args = "SELECT name, data FROM artifacts WHERE job_id = ?", [job_id]
+        if name is not None:
+            query, args = query + " AND name = ?", args + [name]
+        with self._connect() as conn:
+            return [(r["name"], r["data"]) for r in conn.execute(query + " ORDER BY rowid", args)]
+
+    def metrics(self):
+        now = time.time()
+        with self._connect() as conn:
+            depth = dict.fromkeys(JOB_STATUSES, 0)
+            depth.update({r["status"]: r["n"] for r in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")})
+            recent = conn.execute(
+                "SELECT COUNT(*) AS jobs, COALESCE(SUM(invoice_count), 0) AS invoices FROM jobs "
+                "WHERE status = 'done' AND finished_at >= ?", (now - THROUGHPUT_WINDOW_SECONDS,)).fetchone()
+            timings = conn.execute(
+                "SELECT AVG(started_at - submitted_at) AS wait, AVG(finished_at - started_at) AS run FROM jobs "
+                "WHERE status = 'done'").fetchone()
+        return {
+            "queue_depth": depth,
+            "throughput_window_seconds": THROUGHPUT_WINDOW_SECONDS,
+            "jobs_per_second": recent["jobs"] / THROUGHPUT_WINDOW_SECONDS,
+            "invoices_per_second": recent["invoices"] / THROUGHPUT_WINDOW_SECONDS,
+            "mean_queue_wait_seconds": timings["wait"],
+            "mean_run_seconds": timings["run"],
+        }
+
+
+class _JobRunner:
+    """Feeds queued jobs to a process pool, keeping at most `workers` jobs in flight."""
+
+    def __init__(self, queue, workers):
+        self.queue = queue
+        self.workers = workers
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.slots = threading.Semaphore(workers)
+        self.executor = self._new_executor()
+        self.thread = threading.Thread(target=self._dispatch, name="job-dispatcher", daemon=True)
+
+    def _new_executor(self):
+        return _spawn_process_pool(self.workers)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        self.wakeup.set()
+        self.thread.join()
+        self.executor.shutdown(wait=True)
+
+    def _dispatch(self):
+        while not self.stopping.is_set():
+            self.slots.acquire()
+            claimed = self.queue.claim()
+            if claimed is None:
+                self.slots.release()
+                self.wakeup.wait(timeout=1.0)
+                self.wakeup.clear()
+                continue
+            job_id, params = claimed
+            try:
+                future = self.executor.submit(_run_generation_job, params)
+            except BrokenProcessPool as e:
+                # A worker died; jobs already in flight fail through _record. Start a fresh pool for the rest.
+                logging.error(f"Job {job_id} failed: worker pool broke ({e}); restarting it")
+                self.queue.fail(job_id, f"worker pool broke: {e}")
+                self.slots.release()
+                self.executor.shutdown(wait=False)
+                self.executor = self._new_executor()
+                continue
+            future.add_done_callback(lambda f, job_id=job_id: self._record(job_id, f))
+
+    def _record(self, job_id, future):
+        try:
+            seeds, artifacts = future.result()
+            self.queue.finish(job_id, seeds, artifacts)
+        except Exception as e:
+            logging.error(f"Job {job_id} failed: {e}")
+            self.queue.fail(job_id, str(e))
+        finally:
+            self.slots.release()
+
+
+class _JobRequestHandler(http.server.BaseHTTPRequestHandler):
+    queue = None
+    runner = None
+
+    def _send(self, status, body, content_type="application/json", headers=()):
+        if content_type == "application/json":
+            body = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            return self._send(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            params = json.loads(self.rfile.read(length) or b"{}")
+            _job_settings(params)
+        except ValueError as e:  # includes json.JSONDecodeError
+            return self._send(400, {"error": str(e)})
+        except (TypeError, AttributeError, KeyError) as e:  # well-formed JSON with a value of the wrong type
+            return self._send(400, {"error": f"invalid job parameters: {e}"})
+        job_id = self.queue.submit(params)
+        self.runner.wakeup.set()
+        self._send(202, {"job_id": job_id, "status": "queued"}, headers=[("Location", f"/jobs/{job_id}")])
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path == "/metrics":
+            return self._send(200, self.queue.metrics())
+        match = re.fullmatch(r"/jobs/([0-9a-f]+)(?:/(artifacts\.zip|artifacts/(.+)))?", path)
+        if not match:
+            return self._send(404, {"error": "not found"})
+        job_id, artifact_path, name = match.groups()
+        job = self.queue.job(job_id)
+        if job is None:
+            return self._send(404, {"error": f"unknown job {job_id}"})
+        if artifact_path is None:
+            return self._send(200, job)
+        if job["status"] != "done":
+            return self._send(409, {"error": f"job is {job['status']}", "status": job["status"]})
+        if name is None:
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_file:
+                for artifact_name, data in self.queue.artifacts(job_id):
+                    zip_file.writestr(artifact_name, data)
+            return self._send(200, buffer.getvalue(), "application/zip",
+                              [("Content-Disposition", f'attachment; filename="{job_id}.zip"')])
+        found = self.queue.artifacts(job_id, name)
+        if not found:
+            return self._send(404, {"error": f"job {job_id} has no artifact {name}"})
+        content_type = ARTIFACT_CONTENT_TYPES.get(name.rsplit(".", 1)[-1], "application/octet-stream")
+        self._send(200, found[0][1], content_type, [("Content-Disposition", f'attachment; filename="{name}"')])
+
+    def log_message(self, format, *args):
+        logging.info("%s - %s", self.address_string(), format % args)
+
+
+def serve(db_path, host="127.0.0.1", port=8765, workers=None):
+    queue = _JobQueue(db_path)
+    runner = _JobRunner(queue, workers or os.cpu_count() or 1)
+    handler = type("JobRequestHandler", (_JobRequestHandler,), {"queue": queue, "runner": runner})
+    server = http.server.ThreadingHTTPServer((host, port), handler)
+    runner.start()
+    logging.info(f"Serving invoice jobs on http://{host}:{server.server_address[1]} with {runner.workers} workers ({db_path})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        runner.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local invoice generation job server.")
+    parser.add_argument("--db", default="jobs.sqlite3", help="SQLite file holding the queue and artifacts.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    serve(args.db, args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
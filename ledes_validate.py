@@ -0,0 +1,224 @@
+"""Streaming LEDES 1998B parser and batch validator.
+
+Files are parsed line by line into one set of columns for the whole batch,
+and every check is a single vectorized pass over that frame, so validating
+thousands of generated invoices costs about the same as validating one big one.
+
+    python ledes_validate.py out/*.txt --max-daily-hours 16
+"""
+import argparse
+import io
+import os
+import sys
+
+from invoice_engine import EXPENSE_CODES
+
+LEDES_1998B_HEADER = "LEDES1998B[]"
+NUMERIC_FIELDS = ["INVOICE_TOTAL", "LINE_ITEM_NUMBER", "LINE_ITEM_NUMBER_OF_UNITS",
+                  "LINE_ITEM_ADJUSTMENT_AMOUNT", "LINE_ITEM_TOTAL", "LINE_ITEM_UNIT_COST"]
+DATE_FIELDS = ["INVOICE_DATE", "BILLING_START_DATE", "BILLING_END_DATE", "LINE_ITEM_DATE"]
+# 1998B fields every check relies on; a field line without them is a parse error.
+REQUIRED_FIELDS = ["INVOICE_NUMBER", "INVOICE_TOTAL", "BILLING_START_DATE", "BILLING_END_DATE", "LINE_ITEM_NUMBER",
+                   "EXP/FEE/INV_ADJ_TYPE", "LINE_ITEM_NUMBER_OF_UNITS", "LINE_ITEM_TOTAL", "LINE_ITEM_DATE",
+                   "LINE_ITEM_TASK_CODE", "LINE_ITEM_EXPENSE_CODE", "LINE_ITEM_ACTIVITY_CODE", "TIMEKEEPER_ID"]
+ISSUE_COLUMNS = ["FILE", "INVOICE_NUMBER", "LINE_ITEM_NUMBER", "CHECK", "DETAIL"]
+
+DEFAULT_TASK_CODE_PATTERN = r"^L\d{3}$"
+DEFAULT_ACTIVITY_CODE_PATTERN = r"^A\d{3}$"
+
+
+def _iter_ledes_records(lines):
+    """Yields the field lists of each []-terminated record, joining records split across lines."""
+    pending = ""
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line and not pending:
+            continue
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.endswith("[]"):
+            yield pending[:-2].split("|")
+            pending = ""
+    if pending:
+        raise ValueError("file ends in the middle of a record (missing '[]')")
+
+
+def _parse_ledes_1998b(source, name, columns=None):
+    """Parses one LEDES 1998B file into `columns` (field name -> list of str).
+
+    `source` is a path, a text stream or the file's bytes. Passing the same
+    `columns` dict for many files accumulates them into one columnar batch,
+    with the file name in the FILE column. Raises ValueError for files that
+    are not 1998B, whose field line lacks any of REQUIRED_FIELDS, or whose
+    records do not match the field line.
+    """
+    try:
+        if isinstance(source, (bytes, bytearray)):
+            source = io.StringIO(source.decode("utf-8-sig"))
+        handle = open(source, encoding="utf-8-sig") if isinstance(source, (str, os.PathLike)) else source
+    except UnicodeDecodeError as e:
+        raise ValueError(f"{name}: not UTF-8 text ({e})") from e
+    try:
+        first = next(iter(handle), "").strip()
+        if first != LEDES_1998B_HEADER:
+            raise ValueError(f"{name}: expected '{LEDES_1998B_HEADER}' header, found '{first[:40]}'")
+        records = _iter_ledes_records(handle)
+        fields = next(records, None)
+        if not fields:
+            raise ValueError(f"{name}: missing field names line")
+        missing = [field for field in REQUIRED_FIELDS if field not in fields]
+        if missing:
+            raise ValueError(f"{name}: field line is missing {', '.join(missing)}")
+        if columns is None:
+            columns = {}
+        rows_before = len(columns.get("FILE", []))
+        for field in ["FILE"] + fields:
+            # Columns missing from earlier files are back-filled so lengths stay aligned.
+            columns.setdefault(field, [""] * rows_before)
+        targets = [columns[field] for field in fields]
+        file_column = columns["FILE"]
+        count = 0
+        for n, values in enumerate(records, start=1):
+            if len(values) != len(fields):
+                raise ValueError(f"{name}: record {n} has {len(values)} fields, expected {len(fields)}")
+            for target, value in zip(targets, values):
+                target.append(value)
+            count += 1
+        file_column.extend([name] * count)
+        for field, values in columns.items():
+            if len(values) < rows_before + count:
+                values.extend([""] * (rows_before + count - len(values)))
+        return columns
+    except UnicodeDecodeError as e:
+        raise ValueError(f"{name}: not UTF-8 text ({e})") from e
+    finally:
+        if handle is not source:
+            handle.close()
+
+
+def _load_ledes_batch(sources):
+    """Parses [(name, source), ...] into one DataFrame with typed numeric and date columns.
+
+    Returns (frame, errors) where errors lists files that could not be parsed.
+    """
+    import pandas as pd
+    columns, errors = {}, []
+    for name, source in sources:
+        snapshot = {field: len(values) for field, values in columns.items()}
+        try:
+            _parse_ledes_1998b(source, name, columns)
+        except ValueError as e:
+            # Roll back whatever the bad file appended before failing.
+            for field in list(columns):
+                if field in snapshot:
+                    del columns[field][snapshot[field]:]
+                else:
+                    del columns[field]
+            errors.append(str(e))
+    frame = pd.DataFrame(columns)
+    for field in NUMERIC_FIELDS:
+        if field in frame:
+            frame[field] = pd.to_numeric(frame[field], errors="coerce")
+    for field in DATE_FIELDS:
+        if field in frame:
+            frame[field] = pd.to_datetime(frame[field], format="%Y%m%d", errors="coerce")
+    return frame, errors
+
+
+def _issues(frame, mask, check, detail):
+    import pandas as pd
+    hits = frame.loc[mask, ["FILE", "INVOICE_NUMBER", "LINE_ITEM_NUMBER"]].copy()
+    hits["CHECK"] = check
+    hits["DETAIL"] = detail[mask] if isinstance(detail, pd.Series) else detail
+    return hits
+
+
+def _validate_ledes_batch(frame, max_daily_hours=None, task_codes=None, activity_codes=None, expense_codes=None):
+    """Runs every check over a batch frame from _load_ledes_batch; returns a DataFrame of issues.
+
+    Checks: INVOICE_TOTAL equals the sum of LINE_ITEM_TOTAL (compared in
+    cents), LINE_ITEM_NUMBER runs 1..n per invoice, line dates fall inside the
+    billing period, fee hours per timekeeper per day stay within
+    `max_daily_hours`, and task/activity/expense codes are valid. Code sets
+    default to UTBMS-shaped task/activity codes and the app's expense codes.
+    """
+    import pandas as pd
+    if frame.empty:
+        return pd.DataFrame(columns=ISSUE_COLUMNS)
+    found = []
+
+    # Invoice totals, in integer cents so float sums can't drift.
+    line_cents = (frame["LINE_ITEM_TOTAL"] * 100).round().astype("Int64")
+    invoice_cents = (frame["INVOICE_TOTAL"] * 100).round().astype("Int64")
+    keys = [frame["FILE"], frame["INVOICE_NUMBER"]]
+    summed = line_cents.groupby(keys).transform("sum")
+    stated = invoice_cents.groupby(keys).transform("first")
+    first_line = ~frame.duplicated(["FILE", "INVOICE_NUMBER"])
+    bad_total = first_line & (summed != stated).fillna(True)
+    found.append(_issues(frame, bad_total, "invoice_total",
+        "INVOICE_TOTAL " + (stated / 100).map("{:.2f}".format, na_action="ignore")
+        + " != sum of lines " + (summed / 100).map("{:.2f}".format, na_action="ignore")))
+    inconsistent = (invoice_cents != stated).fillna(True)
+    found.append(_issues(frame, inconsistent, "invoice_total", "INVOICE_TOTAL differs between lines of the same invoice"))
+
+    # Sequential line numbering within each invoice; a file may hold several.
+    expected = frame.groupby(["FILE", "INVOICE_NUMBER"]).cumcount() + 1
+    bad_number = (frame["LINE_ITEM_NUMBER"] != expected).fillna(True)
+    found.append(_issues(frame, bad_number, "line_numbering", "expected line " + expected.astype(str)))
+
+    # Dates inside the billing period.
+    unparsed = frame[["LINE_ITEM_DATE", "BILLING_START_DATE", "BILLING_END_DATE"]].isna().any(axis=1)
+    found.append(_issues(frame, unparsed, "dates", "unparseable date"))
+    outside = ~unparsed & ((frame["LINE_ITEM_DATE"] < frame["BILLING_START_DATE"])
+                           | (frame["LINE_ITEM_DATE"] > frame["BILLING_END_DATE"]))
+    found.append(_issues(frame, outside, "dates", "LINE_ITEM_DATE outside billing period"))
+
+    is_fee = frame["EXP/FEE/INV_ADJ_TYPE"] == "F"
+    is_expense = frame["EXP/FEE/INV_ADJ_TYPE"] == "E"
+
+    # Daily hours cap per timekeeper.
+    if max_daily_hours is not None:
+        day_hours = (frame["LINE_ITEM_NUMBER_OF_UNITS"].where(is_fee, 0)
+                     .groupby([frame["FILE"], frame["TIMEKEEPER_ID"], frame["LINE_ITEM_DATE"]]).transform("sum"))
+        over = is_fee & (day_hours > max_daily_hours + 1e-9)
+        found.append(_issues(frame, over, "daily_hours",
+            frame["TIMEKEEPER_ID"] + " billed " + day_hours.round(1).astype(str) + "h on the day"))
+
+    # Code sets.
+    def _invalid(column, allowed, pattern):
+        values = frame[column].fillna("")
+        if allowed is not None:
+            return ~values.isin(list(allowed))
+        return ~values.str.match(pattern)
+    expense_codes = set(EXPENSE_CODES.values()) if expense_codes is None else expense_codes
+    for column, allowed, pattern, rows in (
+        ("LINE_ITEM_TASK_CODE", task_codes, DEFAULT_TASK_CODE_PATTERN, is_fee),
+        ("LINE_ITEM_ACTIVITY_CODE", activity_codes, DEFAULT_ACTIVITY_CODE_PATTERN, is_fee),
+        ("LINE_ITEM_EXPENSE_CODE", expense_codes, None, is_expense),
+    ):
+        bad = rows & _invalid(column, allowed, pattern)
+        found.append(_issues(frame, bad, "codes", f"invalid {column} '" + frame[column].fillna("") + "'"))
+    bad_type = ~frame["EXP/FEE/INV_ADJ_TYPE"].isin(["F", "E", "IF", "IE"])
+    found.append(_issues(frame, bad_type, "codes", "EXP/FEE/INV_ADJ_TYPE must be F, E, IF or IE"))
+
+    issues = pd.concat(found, ignore_index=True)
+    return issues[ISSUE_COLUMNS]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate LEDES 1998B files.")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--max-daily-hours", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    frame, errors = _load_ledes_batch((os.path.basename(path), path) for path in args.files)
+    for error in errors:
+        print(f"PARSE ERROR {error}")
+    issues = _validate_ledes_batch(frame, max_daily_hours=args.max_daily_hours)
+    if not issues.empty:
+        print(issues.to_string(index=False))
+    print(f"{len(args.files)} files, {len(frame)} lines, {len(errors)} unparsed, {len(issues)} issues")
+    return 1 if errors or not issues.empty else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""Synthetic timekeeper rosters for load and scale testing.
+
+Builds N timekeepers (up to SYNTHETIC_ROSTER_MAX) in the same record shape
+_load_timekeepers returns for an uploaded tk_info.csv. Classifications,
+rates and names are drawn in vectorized NumPy batches; names combine first
+and last names from a seeded Faker pool that is built once per seed, so a
+seed always gives the same roster.
+"""
+import functools
+
+SYNTHETIC_ROSTER_MAX = 100_000
+DEFAULT_ROSTER_SEED = 0
+NAME_POOL_DRAWS = 4_000
+
+# (classification, share of the roster, median hourly rate, rate floor, rate ceiling)
+CLASSIFICATION_MIX = [
+    ("Partner", 0.20, 750, 400, 1500),
+    ("Associate", 0.45, 425, 225, 850),
+    ("Paralegal", 0.25, 195, 110, 350),
+    ("Legal Assistant", 0.10, 125, 75, 225),
+]
+RATE_SPREAD = 0.25  # sigma of the log-normal rate draw around each median
+
+# The Spend Agent's mandatory lines look these timekeepers up by name.
+SPEND_AGENT_TIMEKEEPERS = [
+    {"TIMEKEEPER_NAME": "Tom Delaganis", "TIMEKEEPER_CLASSIFICATION": "Partner", "RATE": 750.0},
+    {"TIMEKEEPER_NAME": "Ryan Kinsey", "TIMEKEEPER_CLASSIFICATION": "Associate", "RATE": 425.0},
+]
+
+
+@functools.lru_cache(maxsize=8)
+def _name_pool(seed):
+    """Unique first and last names from a Faker instance seeded with `seed`, in draw order."""
+    from faker import Faker
+    faker = Faker("en_US")
+    faker.seed_instance(seed)
+    reserved = {tk["TIMEKEEPER_NAME"].split()[-1] for tk in SPEND_AGENT_TIMEKEEPERS}
+    first_names = list(dict.fromkeys(faker.first_name() for _ in range(NAME_POOL_DRAWS)))
+    last_names = [name for name in dict.fromkeys(faker.last_name() for _ in range(NAME_POOL_DRAWS)) if name not in reserved]
+    return tuple(first_names), tuple(last_names)
+
+
+def _synthetic_roster(size, seed=DEFAULT_ROSTER_SEED, classification_mix=CLASSIFICATION_MIX, include_spend_agent_timekeepers=True):
+    """Returns `size` timekeeper records with unique IDs (TK000001, ...) and, pool permitting, unique names.
+
+    Classifications follow `classification_mix`; rates are log-normal around
+    each classification's median, clipped to its band and rounded to $5.
+    The Spend Agent's named timekeepers come first unless excluded.
+    """
+    import numpy as np
+    if not 1 <= size <= SYNTHETIC_ROSTER_MAX:
+        raise ValueError(f"Synthetic roster size must be between 1 and {SYNTHETIC_ROSTER_MAX:,}.")
+    rng = np.random.default_rng(seed)
+    anchors = SPEND_AGENT_TIMEKEEPERS[:size] if include_spend_agent_timekeepers else []
+    drawn = size - len(anchors)
+
+    names, shares, medians, floors, ceilings = (np.array(column) for column in zip(*classification_mix))
+    picks = rng.choice(len(names), size=drawn, p=shares / shares.sum())
+    rates = rng.lognormal(np.log(medians[picks]), RATE_SPREAD)
+    rates = np.round(np.clip(rates, floors[picks], ceilings[picks]) / 5) * 5
+
+    first_names, last_names = (np.array(pool, dtype=object) for pool in _name_pool(seed))
+    combinations = len(first_names) * len(last_names)
+    # Distinct (first, last) pairs while the pool lasts; beyond that names may repeat but IDs stay unique.
+    pairs = rng.choice(combinations, size=drawn, replace=drawn > combinations)
+    full_names = first_names[pairs // len(last_names)] + " " + last_names[pairs % len(last_names)]
+
+    ids = np.char.add("TK", np.char.zfill(np.arange(1, size + 1).astype(str), 6))
+    classifications = np.concatenate([[tk["TIMEKEEPER_CLASSIFICATION"] for tk in anchors], names[picks]])
+    all_names = np.concatenate([[tk["TIMEKEEPER_NAME"] for tk in anchors], full_names])
+    all_rates = np.concatenate([[tk["RATE"] for tk in anchors], rates])
+    return [
+        {"TIMEKEEPER_NAME": name, "TIMEKEEPER_CLASSIFICATION": classification, "TIMEKEEPER_ID": tk_id, "RATE": rate}
+        for name, classification, tk_id, rate in zip(all_names.tolist(), classifications.tolist(), ids.tolist(), all_rates.tolist())
+    ]
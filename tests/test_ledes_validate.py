@@ -0,0 +1,111 @@
+"""_parse_ledes_1998b / _load_ledes_batch / _validate_ledes_batch over hand-written 1998B files."""
+import re
+
+import pytest
+
+from invoice_engine import LEDES_1998B_FIELDS
+from ledes_validate import _load_ledes_batch, _parse_ledes_1998b, _validate_ledes_batch
+
+FIELD_LINE = "|".join(LEDES_1998B_FIELDS) + "[]"
+
+
+def _line(invoice_number, line_no, invoice_total, line_total, **overrides):
+    values = dict.fromkeys(LEDES_1998B_FIELDS, "")
+    values.update({
+        "INVOICE_DATE": "20250131", "INVOICE_NUMBER": invoice_number, "INVOICE_TOTAL": invoice_total,
+        "BILLING_START_DATE": "20250101", "BILLING_END_DATE": "20250131", "LINE_ITEM_NUMBER": str(line_no),
+        "EXP/FEE/INV_ADJ_TYPE": "F", "LINE_ITEM_NUMBER_OF_UNITS": "1.0", "LINE_ITEM_ADJUSTMENT_AMOUNT": "0",
+        "LINE_ITEM_TOTAL": line_total, "LINE_ITEM_DATE": "20250110", "LINE_ITEM_TASK_CODE": "L110",
+        "LINE_ITEM_ACTIVITY_CODE": "A101", "TIMEKEEPER_ID": "TK001", "LINE_ITEM_UNIT_COST": line_total,
+    })
+    values.update(overrides)
+    return "|".join(values[field] for field in LEDES_1998B_FIELDS) + "[]"
+
+
+def _file(*lines, field_line=FIELD_LINE):
+    return ("LEDES1998B[]\n" + field_line + "\n" + "\n".join(lines) + "\n").encode("utf-8")
+
+
+def _checks(*files, **kwargs):
+    frame, errors = _load_ledes_batch(files)
+    assert errors == []
+    return sorted(_validate_ledes_batch(frame, **kwargs)["CHECK"])
+
+
+def test_clean_file_with_two_invoices_has_no_issues():
+    data = _file(_line("INV-1", 1, "300.00", "100.00"), _line("INV-1", 2, "300.00", "200.00"),
+                 _line("INV-2", 1, "50.00", "50.00"))
+    assert _checks(("a.txt", data)) == []
+
+
+def test_parse_accumulates_files_into_one_set_of_columns():
+    columns = _parse_ledes_1998b(_file(_line("INV-1", 1, "10.00", "10.00")), "a.txt")
+    _parse_ledes_1998b(_file(_line("INV-2", 1, "20.00", "20.00")), "b.txt", columns)
+    assert columns["FILE"] == ["a.txt", "b.txt"]
+    assert columns["INVOICE_NUMBER"] == ["INV-1", "INV-2"]
+
+
+def test_record_split_across_lines_is_joined():
+    line = _line("INV-1", 1, "10.00", "10.00", LINE_ITEM_DESCRIPTION="first\nsecond")
+    columns = _parse_ledes_1998b(_file(line), "a.txt")
+    assert columns["LINE_ITEM_DESCRIPTION"] == ["first\nsecond"]
+
+
+def test_utf8_bom_is_accepted():
+    columns = _parse_ledes_1998b(b"\xef\xbb\xbf" + _file(_line("INV-1", 1, "10.00", "10.00")), "a.txt")
+    assert columns["INVOICE_NUMBER"] == ["INV-1"]
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"LEDES2000[]\n", "expected 'LEDES1998B[]' header"),
+    (b"LEDES1998B[]\n", "missing field names line"),
+    (_file(_line("INV-1", 1, "10.00", "10.00"))[:-3], "missing '[]'"),
+    (_file("INV-1|10.00[]"), "record 1 has 2 fields"),
+    (_file(_line("INV-1", 1, "10.00", "10.00"), field_line="|".join(f for f in LEDES_1998B_FIELDS if f != "INVOICE_TOTAL") + "[]"),
+     "field line is missing INVOICE_TOTAL"),
+], ids=["header", "no-field-line", "unterminated", "short-record", "missing-field"])
+def test_malformed_files_raise_value_error(data, message):
+    with pytest.raises(ValueError, match=re.escape(message)):
+        _parse_ledes_1998b(data, "bad.txt")
+
+
+def test_bad_file_lands_in_errors_and_is_rolled_back():
+    good = _file(_line("INV-1", 1, "10.00", "10.00"))
+    missing_total = _file(_line("INV-2", 1, "10.00", "10.00"),
+                          field_line="|".join(f for f in LEDES_1998B_FIELDS if f != "INVOICE_TOTAL") + "[]")
+    frame, errors = _load_ledes_batch([("good.txt", good), ("bad.txt", missing_total)])
+    assert errors == ["bad.txt: field line is missing INVOICE_TOTAL"]
+    assert list(frame["FILE"]) == ["good.txt"]
+    assert _validate_ledes_batch(frame).empty
+
+
+def test_invoice_total_mismatch_is_flagged_once_per_invoice():
+    data = _file(_line("INV-1", 1, "300.00", "100.00"), _line("INV-1", 2, "300.00", "199.99"))
+    assert _checks(("a.txt", data)) == ["invoice_total"]
+
+
+def test_totals_are_compared_in_cents():
+    lines = [_line("INV-1", n, "0.30", "0.10") for n in (1, 2, 3)]
+    assert _checks(("a.txt", _file(*lines))) == []
+
+
+def test_line_numbering_gap_is_flagged():
+    data = _file(_line("INV-1", 1, "20.00", "10.00"), _line("INV-1", 3, "20.00", "10.00"))
+    assert _checks(("a.txt", data)) == ["line_numbering"]
+
+
+def test_line_date_outside_billing_period_is_flagged():
+    data = _file(_line("INV-1", 1, "10.00", "10.00", LINE_ITEM_DATE="20250201"))
+    assert _checks(("a.txt", data)) == ["dates"]
+
+
+def test_daily_hours_cap_counts_fee_lines_per_timekeeper_and_day():
+    lines = [_line("INV-1", n, "30.00", "10.00", LINE_ITEM_NUMBER_OF_UNITS="6.0") for n in (1, 2, 3)]
+    assert _checks(("a.txt", _file(*lines)), max_daily_hours=16) == ["daily_hours"] * 3
+    assert _checks(("a.txt", _file(*lines)), max_daily_hours=18) == []
+
+
+def test_invalid_codes_are_flagged():
+    data = _file(_line("INV-1", 1, "20.00", "10.00", LINE_ITEM_TASK_CODE="X1"),
+                 _line("INV-1", 2, "20.00", "10.00", **{"EXP/FEE/INV_ADJ_TYPE": "E", "LINE_ITEM_EXPENSE_CODE": "E999"}))
+    assert _checks(("a.txt", data)) == ["codes", "codes"]
@@ -0,0 +1,57 @@
+"""Integer-cents helpers in invoice_engine."""
+import decimal
+
+import pytest
+
+from invoice_engine import _check_timekeeper_rates, _finalize_invoice_totals, _format_cents, _line_total_cents, _to_cents
+
+
+@pytest.mark.parametrize("amount, cents", [
+    (19.99, 1999), ("19.99", 1999), (decimal.Decimal("19.99"), 1999), (450, 45000),
+    (0.1 + 0.2, 30), ("0.005", 1), ("-1.005", -101), (" 12.5 ", 1250),
+])
+def test_to_cents_rounds_half_up(amount, cents):
+    assert _to_cents(amount) == cents
+
+
+@pytest.mark.parametrize("amount, error", [
+    ("", decimal.InvalidOperation), ("abc", decimal.InvalidOperation), (float("nan"), ValueError),
+])
+def test_to_cents_rejects_non_amounts(amount, error):
+    with pytest.raises(error):
+        _to_cents(amount)
+
+
+@pytest.mark.parametrize("units, rate_cents, cents", [
+    (1.5, 33333, 50000), (0.1, 12345, 1235), (0.3, 10000, 3000), (7, 19, 133),
+])
+def test_line_total_cents_is_exact(units, rate_cents, cents):
+    assert _line_total_cents(units, rate_cents) == cents
+
+
+@pytest.mark.parametrize("cents, text", [(0, "0.00"), (5, "0.05"), (123456, "1234.56"), (-5, "-0.05")])
+def test_format_cents(cents, text):
+    assert _format_cents(cents) == text
+
+
+def test_finalize_invoice_totals_splits_fees_and_expenses():
+    invoice = {"rows": [
+        {"EXPENSE_CODE": "", "HOURS": 1.2, "LINE_ITEM_TOTAL_CENTS": 60000},
+        {"EXPENSE_CODE": "", "HOURS": "0.1", "LINE_ITEM_TOTAL_CENTS": 4500},
+        {"EXPENSE_CODE": "E101", "HOURS": 30, "LINE_ITEM_TOTAL_CENTS": 600},
+    ]}
+    assert _finalize_invoice_totals(invoice) is invoice
+    assert (invoice["fee_cents"], invoice["expense_cents"], invoice["total_cents"]) == (64500, 600, 65100)
+    assert invoice["fee_hours"] == 1.3
+
+
+def test_finalize_invoice_totals_of_empty_invoice():
+    invoice = _finalize_invoice_totals({"rows": []})
+    assert (invoice["total_cents"], invoice["fee_hours"]) == (0, 0.0)
+
+
+def test_check_timekeeper_rates_names_bad_rows():
+    _check_timekeeper_rates([{"TIMEKEEPER_ID": "TK001", "RATE": 450}, {"TIMEKEEPER_ID": "TK002", "RATE": "125.50"}])
+    with pytest.raises(ValueError, match="TK002, TK003"):
+        _check_timekeeper_rates([{"TIMEKEEPER_ID": "TK001", "RATE": 450}, {"TIMEKEEPER_ID": "TK002", "RATE": float("nan")},
+                                 {"TIMEKEEPER_ID": "TK003", "RATE": "n/a"}])